@@ -4,12 +4,20 @@ Web UI for Plex DB Merge. Run with: python app.py
 Then open http://127.0.0.1:5000 in your browser.
 """
 
+import collections
+import gzip
+import hashlib
 import os
+import queue
 import sys
+import time
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify
+from typing import IO, Optional
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 
 import plex_db_merge
 from plex_db_merge import (
@@ -25,6 +33,24 @@ APP_VERSION = os.environ.get("PLEXDB_MERGE_VERSION", "v0.1")
 
 app = Flask(__name__)
 
+# Use orjson for JSON responses when available (optional). /status re-encodes
+# the log tail on every poll; orjson does list-of-str payloads in C, several
+# times faster than stdlib json. All jsonify() calls route through this.
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+
+    class _OrjsonProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = _OrjsonProvider(app)
+except ImportError:
+    pass  # stdlib json works fine, just slower on large log payloads
+
 # Log requests and errors to stdout so "docker logs" on Unraid shows what's happening
 logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(message)s")
 app.logger.setLevel(logging.INFO)
@@ -37,114 +63,327 @@ werk.addHandler(logging.StreamHandler(sys.stdout))
 
 # Root path for the file browser (restricts browsing to this and below). Set BROWSE_ROOT env to override.
 BROWSE_ROOT = os.path.abspath(os.environ.get("BROWSE_ROOT", "/mnt"))
+# Resolved once at startup: realpath() costs an lstat() per path component and
+# the root never changes after import, so /browse shouldn't recompute it.
+BROWSE_ROOT_REAL = os.path.realpath(BROWSE_ROOT)
+BROWSE_ROOT_REAL_SEP = BROWSE_ROOT_REAL + os.sep
+
+# Max log lines kept in memory per job. The full log still goes to the log file;
+# the UI only ever needs the tail, and a bounded deque keeps /status copies cheap.
+LOG_BUFFER_LINES = 2000
+
+# Buffer size for job log files. Lines are handed to a dedicated writer
+# thread which batches up to LOG_BATCH_LINES per writelines() call (waiting
+# LOG_BATCH_WAIT for stragglers), so workers never block on disk and the
+# kernel sees large writes rather than one write(2) syscall per log line.
+LOG_FILE_BUFFER = 65536
+LOG_BATCH_LINES = 64
+LOG_BATCH_WAIT = 0.05
+
+@dataclass(slots=True)
+class JobState:
+    """Shared state for one background job (merge, compare, or arr repair).
+
+    Slots make attribute access a fixed-offset read, keeping the per-line
+    logging path free of string-keyed dict lookups."""
+    status: str = "idle"
+    log: collections.deque = field(default_factory=lambda: collections.deque(maxlen=LOG_BUFFER_LINES))
+    log_total: int = 0  # lines ever appended this job; cursor for ?since=
+    log_file: Optional[IO] = None
+    log_path: Optional[str] = None
+    success: bool = False
+    error: Optional[str] = None
+    stats: Optional[dict] = None  # compare job only
+    source: Optional[str] = None  # arr repair only: "radarr" | "sonarr"
+
 
 # Shared state for the current merge job (single job at a time)
-_state = {"status": "idle", "log": [], "success": False, "error": None, "log_path": None}
+_state = JobState()
 # Compare (preview) job state - runs in background so the request doesn't time out
-_compare_state = {"status": "idle", "log": [], "stats": None, "error": None, "log_path": None}
+_compare_state = JobState()
 # *arr* SQLite repair job (single repair at a time; Radarr and Sonarr share this queue)
-_arr_repair_state = {
-    "status": "idle",
-    "log": [],
-    "success": False,
-    "error": None,
-    "log_path": None,
-    "source": None,  # "radarr" | "sonarr" — which UI started the current job
-}
+_arr_repair_state = JobState()
 _lock = threading.Lock()
+# Signalled on every log append and job status change; lets /status long-poll
+# instead of the client hammering the server on a fixed timer.
+_cond = threading.Condition(_lock)
+
+# All background jobs (merge, compare, Radarr/Sonarr repair) run on this
+# single worker. Flask serves requests with threaded=True, and SQLite plus the
+# sqlite3 CLI really do not want two jobs touching the same files at once; the
+# status checks in /run and /compare guard the common case, but a one-worker
+# pool makes overlap impossible even if two requests race past them.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+
+# Connected /events clients: one bounded queue per browser tab. Guarded by _lock.
+_subscribers: set[queue.Queue] = set()
+
+# When the last tab goes away (no SSE stream, no status poll for this long)
+# there is no point buffering log lines in memory — the on-disk log keeps the
+# full record and the deque only feeds the UI. Must sit comfortably above the
+# client's slowest poll interval (the compare poller backs off to 10 s) or
+# lines appended between polls get dropped as unwatched.
+POLL_IDLE_SECS = 30.0
+_last_poll = 0.0
+
+
+def _broadcast(kind: str, msg: str) -> None:
+    """Push one log line to every connected SSE client (never blocks the worker)."""
+    for q in list(_subscribers):
+        try:
+            q.put_nowait((kind, msg))
+        except queue.Full:
+            pass  # slow client; it can catch up from /status
 
 
-def _log_file_path(prefix: str) -> str:
+# Log lines queued for disk: (file, line) pairs, or (file, None) as the
+# close sentinel posted from a job's finally block. Single consumer below.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+
+def _log_writer() -> None:
+    """Single writer thread: drains the log queue, batching up to
+    LOG_BATCH_LINES lines per file into one writelines() call. Because the
+    queue is FIFO, a (file, None) sentinel is only seen after every line
+    queued before the job finished, so closing there loses nothing."""
+    while True:
+        items = [_log_queue.get()]
+        for _ in range(LOG_BATCH_LINES - 1):
+            try:
+                items.append(_log_queue.get(timeout=LOG_BATCH_WAIT))
+            except queue.Empty:
+                break
+        batches: dict = {}
+        closes = []
+        for f, line in items:
+            if line is None:
+                closes.append(f)
+            else:
+                batches.setdefault(f, []).append(line)
+        for f, lines in batches.items():
+            try:
+                f.writelines(lines)
+                f.flush()
+            except (OSError, ValueError):
+                pass  # disk error; nothing useful to do from here
+        for f in closes:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+
+threading.Thread(target=_log_writer, daemon=True, name="log-writer").start()
+
+
+def _close_log_file(state: JobState) -> None:
+    """Detach the job's log file and hand it to the writer thread, which
+    closes it after writing everything queued ahead of the sentinel."""
+    with _lock:
+        f = state.log_file
+        state.log_file = None
+    if f:
+        _log_queue.put_nowait((f, None))
+
+
+def _pick_log_dir() -> str:
     """
-    Path for a timestamped log file.
+    Directory for job log files, resolved once at import.
     Prefer ./logs but gracefully fall back to /tmp/plexdb-logs if not writable
-    (e.g. when running under a non-root UID in Docker).
+    (e.g. when running under a non-root UID in Docker). Writability does not
+    change while the process runs, so there is no point re-probing with
+    makedirs on every job start.
     """
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # First try cwd/logs
     primary = os.path.join(os.getcwd(), "logs")
     try:
         os.makedirs(primary, exist_ok=True)
-        return os.path.join(primary, f"{prefix}_{ts}.log")
+        return primary
     except PermissionError:
-        # Fall back to /tmp, which is always writable inside the container
         fallback = "/tmp/plexdb-logs"
         try:
             os.makedirs(fallback, exist_ok=True)
         except PermissionError:
             # Last resort: just use /tmp without a subdir
             fallback = "/tmp"
-        return os.path.join(fallback, f"{prefix}_{ts}.log")
+        return fallback
+
+
+_LOG_DIR = _pick_log_dir()
+
+
+def _json_body() -> dict:
+    """Request JSON payload, or {} for empty/malformed bodies."""
+    return request.get_json(silent=True) or {}
+
+
+def _s(data: dict, key: str) -> str:
+    """Stripped string field from a JSON payload; '' when absent or not a string."""
+    v = data.get(key)
+    return v.strip() if isinstance(v, str) else ""
+
+
+def _log_file_path(prefix: str) -> str:
+    """Path for a timestamped log file in the cached log directory."""
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(_LOG_DIR, f"{prefix}_{ts}.log")
+
+
+def _watched() -> bool:
+    """Whether any UI is currently looking: an open /events stream, or a
+    status poll within the last POLL_IDLE_SECS. Caller must hold _lock."""
+    return bool(_subscribers) or (time.monotonic() - _last_poll) < POLL_IDLE_SECS
+
+
+def _touch_poll() -> None:
+    global _last_poll
+    _last_poll = time.monotonic()
 
 
 def _append_log(msg: str) -> None:
     with _lock:
-        _state["log"].append(msg)
-        f = _state.get("log_file")
-        if f:
-            try:
-                f.write(msg + "\n")
-                f.flush()
-            except OSError:
-                pass
+        _state.log_total += 1
+        if _watched():
+            _state.log.append(msg)
+            _broadcast("merge", msg)
+            _cond.notify_all()
+        f = _state.log_file
+    if f:
+        _log_queue.put_nowait((f, msg + "\n"))
+
+
+def _append_log_lines(msgs: list[str]) -> None:
+    """Bulk variant of _append_log: one lock acquisition and one disk write
+    for a whole batch of lines."""
+    if not msgs:
+        return
+    with _lock:
+        _state.log_total += len(msgs)
+        if _watched():
+            _state.log.extend(msgs)
+            for m in msgs:
+                _broadcast("merge", m)
+            _cond.notify_all()
+        f = _state.log_file
+    if f:
+        _log_queue.put_nowait((f, "".join(m + "\n" for m in msgs)))
 
 
 def _append_compare_log(msg: str) -> None:
     with _lock:
-        _compare_state["log"].append(msg)
-        f = _compare_state.get("log_file")
-        if f:
-            try:
-                f.write(msg + "\n")
-                f.flush()
-            except OSError:
-                pass
+        _compare_state.log_total += 1
+        if _watched():
+            _compare_state.log.append(msg)
+            _broadcast("compare", msg)
+            _cond.notify_all()
+        f = _compare_state.log_file
+    if f:
+        _log_queue.put_nowait((f, msg + "\n"))
 
 
 def _append_arr_repair_log(msg: str) -> None:
     with _lock:
-        _arr_repair_state["log"].append(msg)
-        f = _arr_repair_state.get("log_file")
-        if f:
-            try:
-                f.write(msg + "\n")
-                f.flush()
-            except OSError:
-                pass
+        _arr_repair_state.log_total += 1
+        if _watched():
+            _arr_repair_state.log.append(msg)
+            _broadcast("arr", msg)
+            _cond.notify_all()
+        f = _arr_repair_state.log_file
+    if f:
+        _log_queue.put_nowait((f, msg + "\n"))
+
+
+@app.route("/events")
+def events():
+    """Server-Sent Events stream: each new log line is pushed exactly once,
+    tagged with the job it belongs to (merge / compare / arr). The UI uses
+    this to append lines incrementally instead of re-rendering the full log
+    on every poll; /status stays around for the final success/error state."""
+    q: queue.Queue = queue.Queue(maxsize=1000)
+    with _lock:
+        _subscribers.add(q)
+
+    def gen():
+        try:
+            while True:
+                try:
+                    kind, msg = q.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps the connection alive (and lets us
+                    # notice a dropped client via the failed write).
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {msg}\n\n"
+        finally:
+            with _lock:
+                _subscribers.discard(q)
+
+    return Response(stream_with_context(gen()), mimetype="text/event-stream")
 
 
 @app.route("/")
 def index():
-    return render_template_string(INDEX_HTML, version=APP_VERSION)
+    if request.headers.get("If-None-Match") == _INDEX_ETAG:
+        resp = Response(status=304)
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        resp = Response(_INDEX_BODY_GZ, mimetype="text/html")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(_INDEX_BODY, mimetype="text/html")
+    resp.headers["ETag"] = _INDEX_ETAG
+    # no-cache = revalidate each load; a matching ETag then costs a 304
+    # instead of re-sending the page.
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
 
 
 @app.route("/run", methods=["POST"])
 def run():
-    data = request.get_json() or {}
-    old_path = (data.get("old_path") or "").strip()
-    new_path = (data.get("new_path") or "").strip()
-    output_path = (data.get("output_path") or "").strip()
+    data = _json_body()
+    old_path = _s(data, "old_path")
+    new_path = _s(data, "new_path")
+    output_path = _s(data, "output_path")
     recover = bool(data.get("recover"))
     merge_new_items = bool(data.get("merge_new_items"))
 
     with _lock:
-        if _state["status"] == "running":
+        if _state.status == "running":
             return jsonify({"ok": False, "error": "A merge is already running."}), 400
-        if _compare_state["status"] == "running":
+        if _compare_state.status == "running":
             return jsonify({"ok": False, "error": "A compare is running. Wait for it to finish."}), 400
-        _state["status"] = "running"
-        _state["log"] = []
-        _state["success"] = False
-        _state["error"] = None
-        _state["log_path"] = None
+        _state.status = "running"
+        # Starting a job is evidence someone is watching: the worker's first
+        # lines land before the browser's first poll, and without this they
+        # would be skipped as unwatched and lost to ?since=0 forever.
+        _touch_poll()
+        _state.log.clear()
+        _state.log_total = 0
+        _state.success = False
+        _state.error = None
+        _state.log_path = None
         log_path = _log_file_path("plexdb_merge")
         try:
-            _state["log_file"] = open(log_path, "w")
-            _state["log_path"] = log_path
+            _state.log_file = open(log_path, "w", buffering=LOG_FILE_BUFFER)
+            _state.log_path = log_path
         except OSError:
-            _state["log_file"] = None
+            _state.log_file = None
 
     def do_merge():
+        # run_merge can emit thousands of lines per second during bulk row
+        # copies; coalesce them in the worker and flush at ~60 Hz so the
+        # shared lock is taken per batch, not per line.
+        buf: list[str] = []
+        last_flush = time.monotonic()
+
+        def log_cb(msg: str) -> None:
+            nonlocal last_flush
+            buf.append(msg)
+            now = time.monotonic()
+            if len(buf) >= 256 or now - last_flush >= 0.016:
+                _append_log_lines(buf)
+                buf.clear()
+                last_flush = now
+
         try:
             success, err = run_merge(
                 old_path,
@@ -152,51 +391,50 @@ def run():
                 output_path,
                 recover=recover,
                 merge_new_items=merge_new_items,
-                log_callback=_append_log,
+                log_callback=log_cb,
             )
+            _append_log_lines(buf)
+            buf.clear()
             with _lock:
-                _state["status"] = "done"
-                _state["success"] = success
-                _state["error"] = err
+                _state.status = "done"
+                _state.success = success
+                _state.error = err
+                _cond.notify_all()
         finally:
-            with _lock:
-                if _state.get("log_file"):
-                    try:
-                        _state["log_file"].close()
-                    except OSError:
-                        pass
-                    _state["log_file"] = None
-
-    thread = threading.Thread(target=do_merge)
-    thread.start()
+            _append_log_lines(buf)
+            _close_log_file(_state)
+
+    _executor.submit(do_merge)
     return jsonify({"ok": True})
 
 
 @app.route("/compare", methods=["POST"])
 def compare():
     """Start preview in background; returns immediately. Poll /compare_status for result."""
-    data = request.get_json() or {}
-    old_path = (data.get("old_path") or "").strip()
-    new_path = (data.get("new_path") or "").strip()
+    data = _json_body()
+    old_path = _s(data, "old_path")
+    new_path = _s(data, "new_path")
     recover = bool(data.get("recover"))
     merge_new_items = bool(data.get("merge_new_items"))
 
     with _lock:
-        if _state["status"] == "running":
+        if _state.status == "running":
             return jsonify({"ok": False, "error": "A merge is already running."}), 400
-        if _compare_state["status"] == "running":
+        if _compare_state.status == "running":
             return jsonify({"ok": False, "error": "A compare is already running."}), 400
-        _compare_state["status"] = "running"
-        _compare_state["log"] = []
-        _compare_state["stats"] = None
-        _compare_state["error"] = None
-        _compare_state["log_path"] = None
+        _compare_state.status = "running"
+        _touch_poll()  # the first log lines beat the browser's first poll
+        _compare_state.log.clear()
+        _compare_state.log_total = 0
+        _compare_state.stats = None
+        _compare_state.error = None
+        _compare_state.log_path = None
         log_path = _log_file_path("plexdb_compare")
         try:
-            _compare_state["log_file"] = open(log_path, "w")
-            _compare_state["log_path"] = log_path
+            _compare_state.log_file = open(log_path, "w", buffering=LOG_FILE_BUFFER)
+            _compare_state.log_path = log_path
         except OSError:
-            _compare_state["log_file"] = None
+            _compare_state.log_file = None
 
     def do_compare():
         try:
@@ -206,63 +444,153 @@ def compare():
                     old_path, new_path, recover=recover, merge_new_items=merge_new_items
                 )
                 with _lock:
-                    _compare_state["status"] = "done"
-                    _compare_state["success"] = success
-                    _compare_state["stats"] = stats
-                    _compare_state["error"] = err
+                    _compare_state.status = "done"
+                    _compare_state.success = success
+                    _compare_state.stats = stats
+                    _compare_state.error = err
+                    _cond.notify_all()
             finally:
                 plex_db_merge._log_callback = None
         except Exception as e:
             with _lock:
-                _compare_state["status"] = "done"
-                _compare_state["success"] = False
-                _compare_state["stats"] = None
-                _compare_state["error"] = str(e)
+                _compare_state.status = "done"
+                _compare_state.success = False
+                _compare_state.stats = None
+                _compare_state.error = str(e)
+                _cond.notify_all()
         finally:
-            with _lock:
-                if _compare_state.get("log_file"):
-                    try:
-                        _compare_state["log_file"].close()
-                    except OSError:
-                        pass
-                    _compare_state["log_file"] = None
-
-    thread = threading.Thread(target=do_compare)
-    thread.start()
+            _close_log_file(_compare_state)
+
+    _executor.submit(do_compare)
     return jsonify({"ok": True})
 
 
+def _poll_args() -> tuple[int, float]:
+    """Parse ?since=<cursor>&wait=<seconds> for the status endpoints.
+    since < 0 means "full log, no waiting" (the legacy behaviour)."""
+    try:
+        since = int(request.args.get("since", -1))
+    except (TypeError, ValueError):
+        since = -1
+    try:
+        wait = min(float(request.args.get("wait", 0)), 25.0)
+    except (TypeError, ValueError):
+        wait = 0.0
+    return since, wait
+
+
+def _log_tail(state: JobState, since: int) -> list[str]:
+    """Lines appended after cursor `since` (capped by what the deque kept)."""
+    missed = state.log_total - since
+    if missed <= 0:
+        return []
+    tail = list(state.log)
+    return tail[-missed:] if missed < len(tail) else tail
+
+
 @app.route("/compare_status")
 def compare_status():
-    """Poll this after POST /compare to get status, log, and result."""
-    with _lock:
-        return jsonify({
-            "status": _compare_state["status"],
-            "log": _compare_state["log"].copy(),
-            "stats": _compare_state.get("stats"),
-            "success": _compare_state.get("success"),
-            "error": _compare_state.get("error"),
-            "log_path": _compare_state.get("log_path"),
-        })
+    """Poll this after POST /compare to get status, log, and result.
+    Supports ?since=<cursor>&wait=<s>: the request then blocks until new log
+    lines arrive (or the job finishes) and returns only the delta."""
+    _touch_poll()
+    since, wait = _poll_args()
+    with _cond:
+        if wait > 0 and since >= 0 and _compare_state.status == "running" and _compare_state.log_total <= since:
+            _cond.wait(timeout=wait)
+        payload = {
+            "status": _compare_state.status,
+            "stats": _compare_state.stats,
+            "success": _compare_state.success,
+            "error": _compare_state.error,
+            "log_path": _compare_state.log_path,
+        }
+        if since >= 0:
+            payload["log"] = _log_tail(_compare_state, since)
+            payload["next_since"] = _compare_state.log_total
+        else:
+            payload["log"] = list(_compare_state.log)
+    return jsonify(payload)
 
 
 @app.route("/status")
 def status():
+    """Merge job status. Same ?since=&wait= long-poll contract as
+    /compare_status."""
+    _touch_poll()
+    since, wait = _poll_args()
+    with _cond:
+        if wait > 0 and since >= 0 and _state.status == "running" and _state.log_total <= since:
+            _cond.wait(timeout=wait)
+        payload = {
+            "status": _state.status,
+            "success": _state.success,
+            "error": _state.error,
+            "log_path": _state.log_path,
+        }
+        if since >= 0:
+            payload["log"] = _log_tail(_state, since)
+            payload["next_since"] = _state.log_total
+        else:
+            payload["log"] = list(_state.log)
+    return jsonify(payload)
+
+
+_LOG_STATES = {"merge": lambda: _state, "compare": lambda: _compare_state, "arr": lambda: _arr_repair_state}
+
+
+@app.route("/log/<which>")
+def log_file(which):
+    """Serve the current job's on-disk log with byte-Range support.
+
+    A client that remembers its last offset can send `Range: bytes=<off>-`
+    and gets back only what was appended since — a seek plus a read, no
+    JSON-encoding of the whole log buffer like /status does.
+    """
+    getter = _LOG_STATES.get(which)
+    if getter is None:
+        return jsonify({"ok": False, "error": "Unknown log"}), 404
     with _lock:
-        return jsonify({
-            "status": _state["status"],
-            "log": _state["log"].copy(),
-            "success": _state["success"],
-            "error": _state["error"],
-            "log_path": _state.get("log_path"),
-        })
+        log_path = getter().log_path
+    if not log_path:
+        return jsonify({"ok": False, "error": "No log file for this job"}), 404
+    offset = 0
+    rng = request.headers.get("Range", "")
+    if rng.startswith("bytes="):
+        try:
+            # A suffix range (bytes=-N) parses negative; clamp rather than
+            # letting the seek fail and masquerade as a missing file.
+            offset = max(0, int(rng[6:].rstrip("-")))
+        except ValueError:
+            offset = 0
+    try:
+        with open(log_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset > size:
+                offset = size
+            f.seek(offset)
+            body = f.read()
+    except OSError:
+        return jsonify({"ok": False, "error": "Log file unavailable"}), 404
+    if offset and offset >= size:
+        # Nothing appended since the client's offset: an empty 204 beats a
+        # 206 whose Content-Range would have last-byte-pos < first-byte-pos.
+        resp = Response(status=204)
+        resp.headers["Accept-Ranges"] = "bytes"
+        return resp
+    status_code = 206 if offset else 200
+    resp = Response(body, status=status_code, mimetype="text/plain")
+    resp.headers["Accept-Ranges"] = "bytes"
+    if offset:
+        resp.headers["Content-Range"] = f"bytes {offset}-{size - 1}/{size}"
+    return resp
 
 
 @app.route("/integrity_check", methods=["POST"])
 def integrity_check():
     """Run PRAGMA integrity_check on a given DB path and return the raw messages."""
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     ok_ic, messages_ic, err_ic = run_pragma_integrity_check(path)
@@ -277,8 +605,8 @@ def integrity_check():
 
 # ---------- Radarr / Sonarr SQLite repair (same operations; different DB files) ----------
 def _arr_check():
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     ok_ic, messages_ic, err_ic = run_pragma_integrity_check(path)
@@ -297,33 +625,36 @@ def arr_check_route():
 
 
 def _arr_repair_status_json():
+    _touch_poll()
     with _lock:
         return {
-            "status": _arr_repair_state["status"],
-            "log": _arr_repair_state["log"].copy(),
-            "success": _arr_repair_state["success"],
-            "error": _arr_repair_state["error"],
-            "log_path": _arr_repair_state.get("log_path"),
-            "source": _arr_repair_state.get("source"),
+            "status": _arr_repair_state.status,
+            "log": list(_arr_repair_state.log),
+            "success": _arr_repair_state.success,
+            "error": _arr_repair_state.error,
+            "log_path": _arr_repair_state.log_path,
+            "source": _arr_repair_state.source,
         }
 
 
 def _start_arr_repair(*, path: str, output_path: str, source: str, log_prefix: str):
     with _lock:
-        if _arr_repair_state["status"] == "running":
+        if _arr_repair_state.status == "running":
             return jsonify({"ok": False, "error": "A database repair is already running."}), 400
-        _arr_repair_state["status"] = "running"
-        _arr_repair_state["log"] = []
-        _arr_repair_state["success"] = False
-        _arr_repair_state["error"] = None
-        _arr_repair_state["log_path"] = None
-        _arr_repair_state["source"] = source
+        _arr_repair_state.status = "running"
+        _touch_poll()  # the first log lines beat the browser's first poll
+        _arr_repair_state.log.clear()
+        _arr_repair_state.log_total = 0
+        _arr_repair_state.success = False
+        _arr_repair_state.error = None
+        _arr_repair_state.log_path = None
+        _arr_repair_state.source = source
         log_path = _log_file_path(log_prefix)
         try:
-            _arr_repair_state["log_file"] = open(log_path, "w")
-            _arr_repair_state["log_path"] = log_path
+            _arr_repair_state.log_file = open(log_path, "w", buffering=LOG_FILE_BUFFER)
+            _arr_repair_state.log_path = log_path
         except OSError:
-            _arr_repair_state["log_file"] = None
+            _arr_repair_state.log_file = None
 
     def do_repair():
         try:
@@ -331,35 +662,30 @@ def _start_arr_repair(*, path: str, output_path: str, source: str, log_prefix: s
             try:
                 success = recover_db(path, output_path)
                 with _lock:
-                    _arr_repair_state["status"] = "done"
-                    _arr_repair_state["success"] = success
-                    _arr_repair_state["error"] = None if success else "Recovery failed. See log."
+                    _arr_repair_state.status = "done"
+                    _arr_repair_state.success = success
+                    _arr_repair_state.error = None if success else "Recovery failed. See log."
+                    _cond.notify_all()
             finally:
                 plex_db_merge._log_callback = None
         except Exception as e:
             with _lock:
-                _arr_repair_state["status"] = "done"
-                _arr_repair_state["success"] = False
-                _arr_repair_state["error"] = str(e)
+                _arr_repair_state.status = "done"
+                _arr_repair_state.success = False
+                _arr_repair_state.error = str(e)
+                _cond.notify_all()
         finally:
-            with _lock:
-                if _arr_repair_state.get("log_file"):
-                    try:
-                        _arr_repair_state["log_file"].close()
-                    except OSError:
-                        pass
-                    _arr_repair_state["log_file"] = None
-
-    thread = threading.Thread(target=do_repair)
-    thread.start()
+            _close_log_file(_arr_repair_state)
+
+    _executor.submit(do_repair)
     return jsonify({"ok": True})
 
 
 @app.route("/radarr/repair", methods=["POST"])
 def radarr_repair():
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
-    output_path = (data.get("output_path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
+    output_path = _s(data, "output_path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     if not output_path:
@@ -369,9 +695,9 @@ def radarr_repair():
 
 @app.route("/sonarr/repair", methods=["POST"])
 def sonarr_repair():
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
-    output_path = (data.get("output_path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
+    output_path = _s(data, "output_path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     if not output_path:
@@ -390,8 +716,8 @@ def sonarr_status():
 
 
 def _arr_vacuum():
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     success, err = run_vacuum(path)
@@ -407,8 +733,8 @@ def arr_vacuum_route():
 
 
 def _arr_reindex():
-    data = request.get_json() or {}
-    path = (data.get("path") or "").strip()
+    data = _json_body()
+    path = _s(data, "path")
     if not path:
         return jsonify({"ok": False, "error": "Path is required."}), 400
     success, err = run_reindex(path)
@@ -429,1050 +755,106 @@ def browse_root():
     return jsonify({"browse_root": BROWSE_ROOT})
 
 
+# realpath walks every component with lstat(); on a deep Plex path that is a
+# dozen syscalls per browse click for an answer that rarely changes. Cache
+# resolutions briefly — 30 s is short enough that a newly created symlink
+# can't be used to escape BROWSE_ROOT for long.
+_REALPATH_TTL = 30.0
+_realpath_cache: dict[str, tuple[float, str]] = {}
+
+
+def _realpath_cached(path: str) -> str:
+    now = time.monotonic()
+    hit = _realpath_cache.get(path)
+    if hit is not None and now - hit[0] < _REALPATH_TTL:
+        return hit[1]
+    rp = os.path.realpath(path)
+    if len(_realpath_cache) > 256:
+        _realpath_cache.clear()
+    _realpath_cache[path] = (now, rp)
+    return rp
+
+
 @app.route("/browse")
 def browse():
     """List directory contents. path must be under BROWSE_ROOT."""
-    path = (request.args.get("path") or BROWSE_ROOT).strip()
-    path = os.path.normpath(path)
-    if not path.startswith("/"):
-        path = os.path.abspath(path)
-    # Restrict to BROWSE_ROOT
-    try:
-        common = os.path.commonpath([os.path.realpath(path), os.path.realpath(BROWSE_ROOT)])
-    except ValueError:
-        common = ""
-    if os.path.realpath(BROWSE_ROOT) != os.path.commonpath([os.path.realpath(common), os.path.realpath(BROWSE_ROOT)]):
-        return jsonify({"error": "Path not allowed"}), 403
+    raw = request.args.get("path", "").strip()
+    if not raw or raw == BROWSE_ROOT:
+        # Modal open / jump-to-root: the root is allowed by construction, so
+        # skip the normpath/realpath containment dance entirely.
+        path = BROWSE_ROOT
+    else:
+        path = os.path.normpath(raw)
+        if not path.startswith("/"):
+            path = os.path.abspath(path)
+        # Restrict to BROWSE_ROOT (resolved so symlinks can't escape it)
+        rp = _realpath_cached(path)
+        if rp != BROWSE_ROOT_REAL and not rp.startswith(BROWSE_ROOT_REAL_SEP):
+            return jsonify({"error": "Path not allowed"}), 403
     if not os.path.exists(path):
         return jsonify({"error": f"Path does not exist on this server: {path}"}), 400
     if not os.path.isdir(path):
         return jsonify({"error": f"Not a directory (or not accessible): {path}"}), 400
+    dirs = []
+    files = []
     try:
-        entries = os.listdir(path)
+        # scandir classifies entries from the directory read itself (d_type),
+        # so no per-entry stat() is needed like with listdir + isdir.
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                # name[0] is a C-level char compare vs. a startswith() method
+                # call per entry; it adds up on 10k-entry media directories.
+                if name and name[0] == ".":
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                (dirs if is_dir else files).append(name)
     except OSError as e:
         return jsonify({"error": str(e)}), 400
-    dirs = []
-    files = []
-    for name in sorted(entries):
-        if name.startswith("."):
-            continue
-        full = os.path.join(path, name)
-        try:
-            if os.path.isdir(full):
-                dirs.append(name)
-            else:
-                files.append(name)
-        except OSError:
-            continue
+    dirs.sort()
+    files.sort()
+    # One flat list, dirs first: the UI renders it in a single pass and the
+    # payload avoids a second top-level array.
+    entries = [{"n": n, "d": True} for n in dirs]
+    entries += [{"n": n, "d": False} for n in files]
     parent = os.path.dirname(path) if path != BROWSE_ROOT else None
     if parent:
         try:
-            rp = os.path.realpath(parent)
-            rb = os.path.realpath(BROWSE_ROOT)
-            if rp != rb and not rp.startswith(rb + os.sep):
+            rp = _realpath_cached(parent)
+            if rp != BROWSE_ROOT_REAL and not rp.startswith(BROWSE_ROOT_REAL_SEP):
                 parent = None  # don't allow Up above BROWSE_ROOT
         except (ValueError, OSError):
             parent = None
     return jsonify({
         "path": path,
         "parent": parent,
-        "directories": dirs,
-        "files": files,
+        "entries": entries,
     })
 
 
-INDEX_HTML = """<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>Plex DB Merge</title>
-  <style>
-    :root {
-      --bg: #1a1d23;
-      --surface: #252930;
-      --border: #3d434e;
-      --text: #e6e9ef;
-      --muted: #9096a3;
-      --accent: #7c9ce0;
-      --accent-hover: #94b0f0;
-      --accent-dim: rgba(124, 156, 224, 0.22);
-      --success: #8fbc8f;
-      --danger: #d48989;
-    }
-    * { box-sizing: border-box; }
-    body {
-      font-family: 'Segoe UI', system-ui, sans-serif;
-      background: var(--bg);
-      color: var(--text);
-      margin: 0;
-      padding: 1.5rem;
-      min-height: 100vh;
-    }
-    .container { max-width: 720px; margin: 0 auto; }
-    .page-header {
-      display: flex;
-      align-items: baseline;
-      justify-content: space-between;
-      flex-wrap: wrap;
-      gap: 0.35rem 1rem;
-      margin-bottom: 0.35rem;
-    }
-    .page-header h1 {
-      font-size: 1.5rem;
-      font-weight: 600;
-      margin: 0;
-      color: var(--text);
-    }
-    .version-badge {
-      font-size: 0.8rem;
-      font-weight: 500;
-      color: var(--muted);
-    }
-    .tagline {
-      margin: 0 0 1.25rem 0;
-    }
-    .tabs {
-      display: flex;
-      gap: 0.35rem;
-      margin-bottom: 1.25rem;
-      padding: 0.35rem;
-      background: var(--surface);
-      border: 1px solid var(--border);
-      border-radius: 10px;
-    }
-    .tab {
-      flex: 1;
-      padding: 0.6rem 0.75rem;
-      border: none;
-      border-radius: 8px;
-      background: transparent;
-      color: var(--muted);
-      font-size: 0.9rem;
-      font-weight: 600;
-      cursor: pointer;
-      font-family: inherit;
-      transition: color 0.15s ease, background 0.15s ease;
-    }
-    .tab:hover { color: var(--text); }
-    .tab:focus-visible {
-      outline: 2px solid var(--accent);
-      outline-offset: 2px;
-    }
-    .tab.active {
-      background: var(--accent-dim);
-      color: var(--accent);
-    }
-    .tab-panel { display: none; }
-    .tab-panel.active { display: block; }
-    .panel-title {
-      font-size: 1.05rem;
-      font-weight: 600;
-      margin: 0 0 0.75rem 0;
-      color: var(--text);
-    }
-    .sub {
-      color: var(--muted);
-      font-size: 0.9rem;
-      margin-bottom: 1.5rem;
-    }
-    .card {
-      background: var(--surface);
-      border: 1px solid var(--border);
-      border-radius: 10px;
-      padding: 1.25rem;
-      margin-bottom: 1rem;
-    }
-    label {
-      display: block;
-      font-size: 0.85rem;
-      color: var(--muted);
-      margin-bottom: 0.35rem;
-    }
-    input[type="text"] {
-      width: 100%;
-      padding: 0.6rem 0.75rem;
-      background: var(--bg);
-      border: 1px solid var(--border);
-      border-radius: 6px;
-      color: var(--text);
-      font-size: 0.95rem;
-      margin-bottom: 1rem;
-    }
-    input[type="text"]::placeholder { color: var(--muted); }
-    input[type="text"]:focus {
-      outline: none;
-      border-color: var(--accent);
-    }
-    .row {
-      display: flex;
-      align-items: center;
-      gap: 0.5rem;
-      margin-bottom: 0.75rem;
-    }
-    input[type="checkbox"] {
-      width: 1.1rem;
-      height: 1.1rem;
-      accent-color: var(--accent);
-    }
-    .btn {
-      display: inline-block;
-      padding: 0.65rem 1.25rem;
-      background: var(--accent);
-      color: var(--bg);
-      border: none;
-      border-radius: 6px;
-      font-size: 0.95rem;
-      font-weight: 600;
-      cursor: pointer;
-      margin-top: 0.5rem;
-    }
-    .btn:hover { background: var(--accent-hover); }
-    .btn:disabled {
-      opacity: 0.6;
-      cursor: not-allowed;
-    }
-    .log-box {
-      background: var(--bg);
-      border: 1px solid var(--border);
-      border-radius: 6px;
-      padding: 0.75rem 1rem;
-      font-family: ui-monospace, 'Cascadia Code', monospace;
-      font-size: 0.8rem;
-      line-height: 1.45;
-      max-height: 320px;
-      overflow-y: auto;
-      white-space: pre-wrap;
-      word-break: break-word;
-      margin-top: 1rem;
-      min-height: 120px;
-    }
-    .log-box.merge-log:empty::before {
-      content: 'Log output will appear here when you run the merge.';
-      color: var(--muted);
-    }
-    .log-box.arr-log:empty::before {
-      content: 'Repair log will appear here.';
-      color: var(--muted);
-    }
-    .status-idle { color: var(--muted); }
-    .status-running { color: var(--accent); }
-    .status-done { color: var(--success); }
-    .status-done.err { color: var(--danger); }
-    .message { margin-top: 0.5rem; font-size: 0.9rem; }
-    code { background: var(--bg); padding: 0.15rem 0.4rem; border-radius: 4px; font-size: 0.9em; }
-    .path-row { display: flex; gap: 0.5rem; margin-bottom: 1rem; align-items: center; }
-    .path-row input { flex: 1; margin-bottom: 0; }
-    .btn-browse {
-      padding: 0.6rem 1rem;
-      background: var(--surface);
-      border: 1px solid var(--border);
-      color: var(--text);
-      border-radius: 6px;
-      cursor: pointer;
-      font-size: 0.9rem;
-      white-space: nowrap;
-    }
-    .btn-browse:hover { border-color: var(--accent); color: var(--accent); }
-    .modal-overlay {
-      display: none;
-      position: fixed;
-      inset: 0;
-      background: rgba(0,0,0,0.6);
-      z-index: 100;
-      align-items: center;
-      justify-content: center;
-      padding: 1rem;
-    }
-    .modal-overlay.open { display: flex; }
-    .modal {
-      background: var(--surface);
-      border: 1px solid var(--border);
-      border-radius: 10px;
-      max-width: 520px;
-      width: 100%;
-      max-height: 80vh;
-      overflow: hidden;
-      display: flex;
-      flex-direction: column;
-    }
-    .modal-header {
-      padding: 0.75rem 1rem;
-      border-bottom: 1px solid var(--border);
-      display: flex;
-      align-items: center;
-      gap: 0.5rem;
-    }
-    .modal-path { flex: 1; font-size: 0.85rem; color: var(--muted); word-break: break-all; }
-    .modal-body {
-      overflow-y: auto;
-      padding: 0.5rem;
-      min-height: 200px;
-    }
-    .browser-item {
-      padding: 0.5rem 0.75rem;
-      border-radius: 6px;
-      cursor: pointer;
-      font-size: 0.95rem;
-      display: flex;
-      align-items: center;
-      gap: 0.5rem;
-    }
-    .browser-item:hover { background: var(--bg); }
-    .browser-item.dir::before { content: '📁'; }
-    .browser-item.file::before { content: '📄'; }
-    .browser-item.file.db::before { content: '🗄'; }
-    .modal-footer { padding: 0.75rem 1rem; border-top: 1px solid var(--border); }
-  </style>
-</head>
-<body>
-  <div class="container">
-    <div class="page-header">
-      <h1>Plex DB Merge</h1>
-      <span class="version-badge">{{ version }}</span>
-    </div>
-    <p class="sub tagline">Merge a Plex library DB, or run SQLite maintenance on Radarr / Sonarr databases.</p>
-
-    <nav class="tabs" role="tablist" aria-label="Tool">
-      <button type="button" class="tab active" role="tab" aria-selected="true" tabindex="0" data-tab="plex">Plex merge</button>
-      <button type="button" class="tab" role="tab" aria-selected="false" tabindex="-1" data-tab="radarr">Radarr</button>
-      <button type="button" class="tab" role="tab" aria-selected="false" tabindex="-1" data-tab="sonarr">Sonarr</button>
-    </nav>
-
-    <div id="panel-plex" class="tab-panel active" role="tabpanel">
-    <div class="card">
-      <label for="old_path">Old backup DB (good)</label>
-      <div class="path-row">
-        <input type="text" id="old_path" placeholder="e.g. /mnt/user/.../com.plexapp.plugins.library.db-2025-10-19">
-        <button type="button" class="btn-browse" data-target="old_path">Browse</button>
-      </div>
-
-      <label for="new_path">New / corrupt DB</label>
-      <div class="path-row">
-        <input type="text" id="new_path" placeholder="e.g. /mnt/user/.../com.plexapp.plugins.library.db">
-        <button type="button" class="btn-browse" data-target="new_path">Browse</button>
-      </div>
-
-      <label for="output_path">Output merged DB</label>
-      <div class="path-row">
-        <input type="text" id="output_path" placeholder="e.g. /mnt/user/.../com.plexapp.plugins.library.db-merged">
-        <button type="button" class="btn-browse" data-target="output_path">Browse</button>
-      </div>
-      <p class="sub" style="margin-top: -0.5rem; margin-bottom: 0.5rem;">Browse shows folders on the <strong>machine where this app is running</strong>. If you see "Not a directory" or "does not exist", run this app on the same host that has the Plex DB (e.g. on your Unraid box).</p>
-      <label for="browse_start">Start browse at (optional)</label>
-      <div class="path-row">
-        <input type="text" id="browse_start" placeholder="e.g. /mnt/user — use when server root is empty">
-      </div>
-
-      <div class="row">
-        <input type="checkbox" id="recover" name="recover">
-        <label for="recover" style="margin:0;">Try to recover corrupt DB (sqlite3 .recover) if it won't open</label>
-      </div>
-      <div class="row">
-        <input type="checkbox" id="merge_new_items" name="merge_new_items">
-        <label for="merge_new_items" style="margin:0;">Also copy new library items (metadata + media) with ID remap</label>
-      </div>
-
-      <div style="display: flex; gap: 0.5rem; margin-top: 0.75rem;">
-        <button type="button" class="btn-browse" id="previewBtn">Preview comparison</button>
-        <button type="button" class="btn" id="runBtn">Run merge</button>
-      </div>
-      <div id="compareResult" class="compare-result" style="display: none; margin-top: 1rem; padding: 0.75rem; background: var(--bg); border-radius: 6px; font-size: 0.9rem;"></div>
-    </div>
-
-    <div class="card">
-      <div id="statusLine" class="status-idle">Idle</div>
-      <div id="message" class="message" style="display:none;"></div>
-      <div class="log-box merge-log" id="logBox"></div>
-    </div>
-    </div>
-
-    <div id="panel-radarr" class="tab-panel" role="tabpanel">
-    <div class="card">
-      <h2 class="panel-title">Radarr SQLite</h2>
-      <p class="sub" style="margin-bottom: 1rem; margin-top: 0;">Integrity check, <code>sqlite3 .recover</code> repair, <code>VACUUM</code>, and <code>REINDEX</code> for <code>radarr.db</code> (or <code>com.radarr.db</code>). Stop Radarr before repair, vacuum, or reindex.</p>
-      <label for="radarr_path">Database path</label>
-      <div class="path-row">
-        <input type="text" id="radarr_path" placeholder="e.g. /mnt/user/appdata/radarr/radarr.db" autocomplete="off">
-        <button type="button" class="btn-browse" data-target="radarr_path">Browse</button>
-      </div>
-      <label for="radarr_output_path">Output path (repair only)</label>
-      <div class="path-row">
-        <input type="text" id="radarr_output_path" placeholder="e.g. /mnt/user/appdata/radarr/radarr-repaired.db" autocomplete="off">
-        <button type="button" class="btn-browse" data-target="radarr_output_path">Browse</button>
-      </div>
-      <p class="sub" style="margin-top: -0.5rem; margin-bottom: 0.75rem;">The file browser uses <strong>Start browse at</strong> from the Plex tab when set.</p>
-      <div style="display: flex; flex-wrap: wrap; gap: 0.5rem; margin-top: 0.75rem;">
-        <button type="button" class="btn-browse" id="radarrCheckBtn">Check</button>
-        <button type="button" class="btn" id="radarrRepairBtn">Repair</button>
-        <button type="button" class="btn-browse" id="radarrVacuumBtn">Vacuum</button>
-        <button type="button" class="btn-browse" id="radarrReindexBtn">Reindex</button>
-      </div>
-      <div id="radarrCheckResult" style="display: none; margin-top: 1rem; padding: 0.75rem; background: var(--bg); border-radius: 6px; font-size: 0.9rem;"></div>
-      <div id="radarrRepairStatus" class="status-idle" style="margin-top: 0.75rem;"></div>
-      <div class="log-box arr-log" id="radarrLogBox" style="margin-top: 0.5rem; min-height: 80px;"></div>
-    </div>
-    </div>
-
-    <div id="panel-sonarr" class="tab-panel" role="tabpanel">
-    <div class="card">
-      <h2 class="panel-title">Sonarr SQLite</h2>
-      <p class="sub" style="margin-bottom: 1rem; margin-top: 0;">Same tools as Radarr for <code>sonarr.db</code> — different schema, same SQLite maintenance. Stop Sonarr before repair, vacuum, or reindex.</p>
-      <label for="sonarr_path">Database path</label>
-      <div class="path-row">
-        <input type="text" id="sonarr_path" placeholder="e.g. /mnt/user/appdata/sonarr/sonarr.db" autocomplete="off">
-        <button type="button" class="btn-browse" data-target="sonarr_path">Browse</button>
-      </div>
-      <label for="sonarr_output_path">Output path (repair only)</label>
-      <div class="path-row">
-        <input type="text" id="sonarr_output_path" placeholder="e.g. /mnt/user/appdata/sonarr/sonarr-repaired.db" autocomplete="off">
-        <button type="button" class="btn-browse" data-target="sonarr_output_path">Browse</button>
-      </div>
-      <div style="display: flex; flex-wrap: wrap; gap: 0.5rem; margin-top: 0.75rem;">
-        <button type="button" class="btn-browse" id="sonarrCheckBtn">Check</button>
-        <button type="button" class="btn" id="sonarrRepairBtn">Repair</button>
-        <button type="button" class="btn-browse" id="sonarrVacuumBtn">Vacuum</button>
-        <button type="button" class="btn-browse" id="sonarrReindexBtn">Reindex</button>
-      </div>
-      <div id="sonarrCheckResult" style="display: none; margin-top: 1rem; padding: 0.75rem; background: var(--bg); border-radius: 6px; font-size: 0.9rem;"></div>
-      <div id="sonarrRepairStatus" class="status-idle" style="margin-top: 0.75rem;"></div>
-      <div class="log-box arr-log" id="sonarrLogBox" style="margin-top: 0.5rem; min-height: 80px;"></div>
-    </div>
-    </div>
-  </div>
-
-  <div class="modal-overlay" id="browseModal">
-    <div class="modal">
-      <div class="modal-header">
-        <button type="button" class="btn-browse" id="browseUp">↑ Up</button>
-        <span class="modal-path" id="browsePath"></span>
-      </div>
-      <div class="modal-body" id="browseList"></div>
-      <div class="modal-footer">
-        <button type="button" class="btn-browse" id="browseCancel">Cancel</button>
-      </div>
-    </div>
-  </div>
-
-  <script>
-    const runBtn = document.getElementById('runBtn');
-    const oldPath = document.getElementById('old_path');
-    const newPath = document.getElementById('new_path');
-    const outputPath = document.getElementById('output_path');
-    const recover = document.getElementById('recover');
-    const mergeNewItems = document.getElementById('merge_new_items');
-    const statusLine = document.getElementById('statusLine');
-    const message = document.getElementById('message');
-    const logBox = document.getElementById('logBox');
-    const browseModal = document.getElementById('browseModal');
-    const browsePathEl = document.getElementById('browsePath');
-    const browseListEl = document.getElementById('browseList');
-    const browseUpBtn = document.getElementById('browseUp');
-    const browseCancelBtn = document.getElementById('browseCancel');
-    const previewBtn = document.getElementById('previewBtn');
-    const compareResult = document.getElementById('compareResult');
-    const checkPath = document.getElementById('check_path');
-    const checkBtn = document.getElementById('checkBtn');
-    const checkResult = document.getElementById('checkResult');
-
-    document.querySelectorAll('.tab').forEach((btn, _i, tabList) => {
-      btn.addEventListener('click', () => {
-        const id = btn.dataset.tab;
-        tabList.forEach(t => {
-          const on = t === btn;
-          t.classList.toggle('active', on);
-          t.setAttribute('aria-selected', on ? 'true' : 'false');
-          t.tabIndex = on ? 0 : -1;
-        });
-        document.querySelectorAll('.tab-panel').forEach(p => {
-          p.classList.toggle('active', p.id === 'panel-' + id);
-        });
-      });
-    });
-
-    let pollTimer = null;
-    let browseTargetId = null;
-
-    function loadBrowse(path) {
-      const url = '/browse' + (path ? '?path=' + encodeURIComponent(path) : '');
-      fetch(url)
-        .then(r => {
-          if (!r.ok) return r.json().then(d => { throw new Error(d.error || r.statusText); });
-          return r.json();
-        })
-        .then(d => {
-          browsePathEl.textContent = d.path;
-          browseListEl.innerHTML = '';
-          if (d.parent !== null) {
-            browseUpBtn.style.display = 'inline-block';
-            browseUpBtn.dataset.parent = d.parent;
-          } else {
-            browseUpBtn.style.display = 'none';
-          }
-          d.directories.forEach(name => {
-            const div = document.createElement('div');
-            div.className = 'browser-item dir';
-            div.textContent = name + ' /';
-            div.onclick = () => loadBrowse(d.path + '/' + name);
-            browseListEl.appendChild(div);
-          });
-          d.files.forEach(name => {
-            const div = document.createElement('div');
-            div.className = 'browser-item file' + (name.endsWith('.db') ? ' db' : '');
-            div.textContent = name;
-            div.onclick = () => {
-              const full = d.path + '/' + name;
-              const input = document.getElementById(browseTargetId);
-              if (input) input.value = full;
-              browseModal.classList.remove('open');
-            };
-            browseListEl.appendChild(div);
-          });
-          if (d.directories.length === 0 && d.files.length === 0) {
-            const empty = document.createElement('div');
-            empty.className = 'sub';
-            empty.textContent = 'This folder is empty.';
-            browseListEl.appendChild(empty);
-          }
-        })
-        .catch(err => {
-          browseListEl.innerHTML = '<div class="sub" style="color: var(--danger);">' + err.message + '</div>';
-        });
-    }
-
-    const browseStartInput = document.getElementById('browse_start');
-    document.querySelectorAll('.btn-browse[data-target]').forEach(btn => {
-      btn.addEventListener('click', () => {
-        browseTargetId = btn.dataset.target;
-        const input = document.getElementById(browseTargetId);
-        let startPath = (browseStartInput && browseStartInput.value.trim()) ? browseStartInput.value.trim().replace(/\\\\/g, '/') : '';
-        if (!startPath && input && input.value.trim()) {
-          const p = input.value.trim().replace(/\\\\/g, '/');
-          const last = p.lastIndexOf('/');
-          startPath = last > 0 ? p.slice(0, last) : '';
-        }
-        browseModal.classList.add('open');
-        loadBrowse(startPath || undefined);
-      });
-    });
-    browseUpBtn.addEventListener('click', () => {
-      const parent = browseUpBtn.dataset.parent;
-      if (parent !== undefined) loadBrowse(parent);
-    });
-    browseCancelBtn.addEventListener('click', () => browseModal.classList.remove('open'));
-    browseModal.addEventListener('click', e => {
-      if (e.target === browseModal) browseModal.classList.remove('open');
-    });
-
-    let comparePollTimer = null;
-    function pollCompare() {
-      fetch('/compare_status')
-        .then(r => r.json())
-        .then(d => {
-          if (d.status === 'running') {
-            compareResult.innerHTML = '<strong>Comparing…</strong> (can take 10–20 min for large DBs; logs update every 2s)<br><pre class="sub" style="margin-top:0.5rem; white-space:pre-wrap; font-size:0.85rem; max-height:12rem; overflow:auto; border:1px solid var(--border); padding:0.5rem;">' + (d.log && d.log.length ? d.log.join('\\n') : '…') + '</pre>';
-            if (!comparePollTimer) comparePollTimer = setInterval(pollCompare, 2000);
-            return;
-          }
-          if (comparePollTimer) {
-            clearInterval(comparePollTimer);
-            comparePollTimer = null;
-          }
-          previewBtn.disabled = false;
-          if (d.status === 'done') {
-            const logNote = d.log_path ? '<br><span class="sub">Log saved to: ' + d.log_path + '</span>' : '';
-            if (d.success && d.stats) {
-              const s = d.stats;
-              const sampleRows = Array.isArray(s.watch_rows_to_add_preview) ? s.watch_rows_to_add_preview : [];
-              function htmlEscape(x) {
-                return (x === null || x === undefined) ? '' : String(x)
-                  .replace(/&/g, '&amp;')
-                  .replace(/</g, '&lt;')
-                  .replace(/>/g, '&gt;')
-                  .replace(/"/g, '&quot;')
-                  .replace(/'/g, '&#39;');
-              }
-              const sampleHtml = sampleRows.length
-                ? '<details style="margin-top:0.75rem;"><summary class="sub">Sample watch rows to add (' + sampleRows.length + ' shown)</summary>' +
-                  '<pre class="sub" style="margin-top:0.5rem; white-space:pre-wrap; font-size:0.8rem; max-height:12rem; overflow:auto; border:1px solid var(--border); padding:0.5rem;">' +
-                  sampleRows.map(r => {
-                      return (htmlEscape(r.viewed_at) + ' | ' + htmlEscape(r.title) + ' | ' + htmlEscape(r.guid));
-                  }).join('\\n') +
-                  '</pre></details>'
-                : '';
-              compareResult.innerHTML =
-                '<strong>What will be merged (preview):</strong><br>' +
-                '• Watch history entries to add: ' + s.views_to_add + '<br>' +
-                '• Per-item settings to add: ' + s.settings_to_add + '<br>' +
-                (typeof s.old_views_total === 'number' && typeof s.new_views_total === 'number'
-                  ? '• Watch rows (old → new): ' + s.old_views_total + ' → ' + s.new_views_total + '<br>'
-                  : '') +
-                (typeof s.old_settings_total === 'number' && typeof s.new_settings_total === 'number'
-                  ? '• Settings rows (old → new): ' + s.old_settings_total + ' → ' + s.new_settings_total + '<br>'
-                  : '') +
-                (s.new_metadata_items_to_add > 0
-                  ? '• New library items to copy: ' + s.new_metadata_items_to_add + ' (with "Also copy new library items" enabled)<br>'
-                  : '') +
-                sampleHtml +
-                '<span class="sub">Run merge to apply. After merging, replace the Plex DB with the output file (see steps below when done).</span>' +
-                logNote;
-            } else {
-              compareResult.innerHTML =
-                '<span style="color: var(--danger);">' +
-                (d.error || 'Preview failed') +
-                '</span>' +
-                (d.log_path ? '<br><span class="sub">Log saved to: ' + d.log_path + '</span>' : '');
-            }
-          } else {
-            compareResult.innerHTML = '<span class="sub">Idle.</span>';
-          }
-        })
-        .catch(() => {
-          if (comparePollTimer) clearInterval(comparePollTimer);
-          comparePollTimer = null;
-          previewBtn.disabled = false;
-          compareResult.innerHTML = '<span style="color: var(--danger);">Request failed.</span>';
-        });
-    }
-    previewBtn.addEventListener('click', () => {
-      const old = oldPath.value.trim();
-      const new_ = newPath.value.trim();
-      if (!old || !new_) {
-        alert('Fill in at least Old and New DB paths to preview.');
-        return;
-      }
-      compareResult.style.display = 'block';
-      compareResult.textContent = 'Starting compare…';
-      previewBtn.disabled = true;
-      fetch('/compare', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          old_path: old,
-          new_path: new_,
-          recover: recover.checked,
-          merge_new_items: mergeNewItems.checked
-        })
-      })
-        .then(r => r.json())
-        .then(d => {
-          if (!d.ok) {
-            compareResult.innerHTML = '<span style="color: var(--danger);">' + (d.error || 'Preview failed') + '</span>';
-            previewBtn.disabled = false;
-            return;
-          }
-          pollCompare();
-        })
-        .catch(() => {
-          compareResult.innerHTML = '<span style="color: var(--danger);">Request failed.</span>';
-          previewBtn.disabled = false;
-        });
-    });
-
-    function setStatus(text, klass) {
-      statusLine.textContent = text;
-      statusLine.className = klass || 'status-idle';
-    }
-
-    function poll() {
-      fetch('/status')
-        .then(r => r.json())
-        .then(d => {
-          logBox.textContent = d.log.join('\\n');
-          logBox.scrollTop = logBox.scrollHeight;
-
-          if (d.status === 'running') {
-            setStatus('Running…', 'status-running');
-            runBtn.disabled = true;
-            if (!pollTimer) pollTimer = setInterval(poll, 500);
-            return;
-          }
-
-          if (pollTimer) {
-            clearInterval(pollTimer);
-            pollTimer = null;
-          }
-          runBtn.disabled = false;
-
-          if (d.status === 'done') {
-            const logNote = d.log_path ? '<br><br>Log saved to: ' + d.log_path : '';
-            if (d.success) {
-              setStatus('Done', 'status-done');
-              message.style.display = 'block';
-              message.style.color = 'var(--success)';
-              message.innerHTML = 'Merge completed.<br><strong>Next steps:</strong><br>1. Stop Plex Media Server.<br>2. Back up the current DB (rename or move it).<br>3. Replace it with the merged file (rename the output to com.plexapp.plugins.library.db).<br>4. Fix ownership if needed (e.g. chown on Unraid).<br>5. Start Plex. It should start with the old library plus merged watch history/settings.<br>6. Optional: run Scan Library or Refresh metadata if anything looks missing.' + logNote;
-            } else {
-              setStatus('Failed', 'status-done err');
-              message.style.display = 'block';
-              message.style.color = 'var(--danger)';
-              message.innerHTML = (d.error || 'Merge failed.') + logNote;
-            }
-          } else {
-            setStatus('Idle', 'status-idle');
-            message.style.display = 'none';
-          }
-        })
-        .catch(() => {
-          if (pollTimer) clearInterval(pollTimer);
-          runBtn.disabled = false;
-          setStatus('Error', 'status-done err');
-        });
-    }
-
-    runBtn.addEventListener('click', () => {
-      const old = oldPath.value.trim();
-      const new_ = newPath.value.trim();
-      const out = outputPath.value.trim();
-      if (!old || !new_ || !out) {
-        alert('Please fill in all three paths.');
-        return;
-      }
-      message.style.display = 'none';
-      logBox.textContent = '';
-      setStatus('Starting…', 'status-running');
-      runBtn.disabled = true;
-
-      fetch('/run', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          old_path: old,
-          new_path: new_,
-          output_path: out,
-          recover: recover.checked,
-          merge_new_items: mergeNewItems.checked
-        })
-      })
-        .then(r => r.json())
-        .then(d => {
-          if (!d.ok) {
-            alert(d.error || 'Failed to start.');
-            runBtn.disabled = false;
-            setStatus('Idle', 'status-idle');
-            return;
-          }
-          pollTimer = setInterval(poll, 500);
-          poll();
-        })
-        .catch(() => {
-          alert('Request failed.');
-          runBtn.disabled = false;
-          setStatus('Idle', 'status-idle');
-        });
-    });
-
-    function arrAppLabel(source) {
-      return source === 'sonarr' ? 'Sonarr' : 'Radarr';
-    }
-
-    const arrTabUIs = [];
-
-    let arrRepairPollTimer = null;
-    function stopArrRepairPoll() {
-      if (arrRepairPollTimer) {
-        clearInterval(arrRepairPollTimer);
-        arrRepairPollTimer = null;
-      }
-    }
-    function applyArrRepairStatus(d) {
-      arrTabUIs.forEach(ui => {
-        const logBox = ui.logBox;
-        const repairStatus = ui.repairStatus;
-        const repairBtn = ui.repairBtn;
-        const checkResult = ui.checkResult;
-        const mySource = ui.mySource;
-        const appName = ui.appName;
-        const peerName = ui.peerName;
-        const showResult = ui.showResult;
-
-        logBox.textContent = (d.log || []).join('\\n');
-        logBox.scrollTop = logBox.scrollHeight;
-        const running = d.status === 'running';
-        const src = d.source || null;
-        const foreign = running && src && src !== mySource;
-
-        if (foreign) {
-          repairStatus.textContent = 'Repair running (started from ' + peerName + ')…';
-          repairStatus.className = 'status-running';
-          repairBtn.disabled = true;
-          return;
-        }
 
-        if (running) {
-          repairStatus.textContent = 'Repair running…';
-          repairStatus.className = 'status-running';
-          repairBtn.disabled = true;
-          return;
-        }
-
-        repairBtn.disabled = false;
-
-        if (d.status === 'done') {
-          const who = arrAppLabel(src);
-          const initiatedHere = src === mySource;
-          if (d.success) {
-            repairStatus.textContent = initiatedHere ? 'Done' : 'Done (' + who + ' repair)';
-            repairStatus.className = 'status-done';
-            if (initiatedHere) {
-              showResult('<span style="color: var(--success);">Repair completed. Stop ' + who + ', replace the DB file with the output file, then start ' + who + '.</span>' + (d.log_path ? '<br><span class="sub">Log: ' + d.log_path + '</span>' : ''));
-            }
-          } else {
-            repairStatus.textContent = 'Failed';
-            repairStatus.className = 'status-done err';
-            if (initiatedHere) {
-              showResult('<span style="color: var(--danger);">' + (d.error || 'Repair failed.') + '</span>' + (d.log_path ? '<br><span class="sub">Log: ' + d.log_path + '</span>' : ''));
-            }
-          }
-        } else {
-          repairStatus.textContent = 'Idle';
-          repairStatus.className = 'status-idle';
-        }
-      });
-    }
-    function pollArrRepairShared() {
-      fetch('/radarr/status')
-        .then(r => r.json())
-        .then(d => {
-          applyArrRepairStatus(d);
-          if (d.status !== 'running') stopArrRepairPoll();
-        })
-        .catch(() => {
-          stopArrRepairPoll();
-          arrTabUIs.forEach(ui => {
-            ui.repairBtn.disabled = false;
-            ui.repairStatus.textContent = 'Error';
-            ui.repairStatus.className = 'status-done err';
-          });
-        });
-    }
-    function startArrRepairPoll() {
-      if (arrRepairPollTimer) return;
-      arrRepairPollTimer = setInterval(pollArrRepairShared, 500);
-    }
-
-    function wireArrTab(cfg) {
-      const api = cfg.api;
-      const mySource = cfg.mySource;
-      const appName = cfg.appName;
-      const peerName = cfg.peerName;
-      const pathEl = document.getElementById(cfg.pathId);
-      const outEl = document.getElementById(cfg.outId);
-      const checkBtn = document.getElementById(cfg.checkBtnId);
-      const repairBtn = document.getElementById(cfg.repairBtnId);
-      const vacuumBtn = document.getElementById(cfg.vacuumBtnId);
-      const reindexBtn = document.getElementById(cfg.reindexBtnId);
-      const checkResult = document.getElementById(cfg.checkResultId);
-      const repairStatus = document.getElementById(cfg.repairStatusId);
-      const logBox = document.getElementById(cfg.logBoxId);
-
-      function showResult(html) {
-        checkResult.style.display = 'block';
-        checkResult.innerHTML = html;
-      }
-
-      arrTabUIs.push({
-        logBox, repairStatus, repairBtn, checkResult, mySource, appName, peerName, showResult,
-      });
-
-      checkBtn.addEventListener('click', () => {
-        const p = (pathEl.value || '').trim();
-        if (!p) {
-          alert('Enter ' + appName + ' DB path.');
-          return;
-        }
-        checkBtn.disabled = true;
-        showResult('<span class="sub">Running integrity_check…</span>');
-        fetch(api + '/check', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ path: p })
-        })
-          .then(r => r.json())
-          .then(d => {
-            checkBtn.disabled = false;
-            const msgs = d.messages || [];
-            if (d.error && !msgs.length && !d.ok) {
-              showResult('<span style="color: var(--danger);">' + (d.error || '') + '</span>');
-              return;
-            }
-            if (d.ok && msgs.length === 1 && msgs[0].toLowerCase() === 'ok') {
-              showResult('<span style="color: var(--success);">integrity_check: OK</span>');
-              return;
-            }
-            let html = '';
-            if (d.error) html += '<span style="color: var(--danger);">' + d.error + '</span><br>';
-            if (msgs.length) {
-              html += '<strong>integrity_check reported ' + msgs.length + ' issue(s):</strong><br><pre class="sub" style="margin-top:0.5rem; white-space:pre-wrap; max-height:12rem; overflow:auto; border:1px solid var(--border); padding:0.5rem;">' + msgs.join('\\n') + '</pre>';
-            }
-            showResult(html || '<span class="sub">No output.</span>');
-          })
-          .catch(() => {
-            checkBtn.disabled = false;
-            showResult('<span style="color: var(--danger);">Request failed.</span>');
-          });
-      });
-
-      repairBtn.addEventListener('click', () => {
-        const p = (pathEl.value || '').trim();
-        const out = (outEl.value || '').trim();
-        if (!p || !out) {
-          alert('Enter both ' + appName + ' DB path and output path.');
-          return;
-        }
-        checkResult.style.display = 'block';
-        logBox.textContent = '';
-        repairStatus.textContent = 'Starting…';
-        repairStatus.className = 'status-running';
-        repairBtn.disabled = true;
-        fetch(api + '/repair', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ path: p, output_path: out })
-        })
-          .then(r => r.json())
-          .then(d => {
-            if (!d.ok) {
-              alert(d.error || 'Failed to start repair.');
-              repairBtn.disabled = false;
-              repairStatus.className = 'status-idle';
-              return;
-            }
-            startArrRepairPoll();
-            pollArrRepairShared();
-          })
-          .catch(() => {
-            alert('Request failed.');
-            repairBtn.disabled = false;
-            repairStatus.className = 'status-idle';
-          });
-      });
-
-      vacuumBtn.addEventListener('click', () => {
-        const p = (pathEl.value || '').trim();
-        if (!p) {
-          alert('Enter ' + appName + ' DB path.');
-          return;
-        }
-        vacuumBtn.disabled = true;
-        showResult('<span class="sub">Running VACUUM… (stop ' + appName + ' first)</span>');
-        fetch(api + '/vacuum', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ path: p })
-        })
-          .then(r => r.json())
-          .then(d => {
-            vacuumBtn.disabled = false;
-            if (d.ok) showResult('<span style="color: var(--success);">' + (d.message || 'VACUUM completed.') + '</span>');
-            else showResult('<span style="color: var(--danger);">' + (d.error || 'VACUUM failed.') + '</span>');
-          })
-          .catch(() => {
-            vacuumBtn.disabled = false;
-            showResult('<span style="color: var(--danger);">Request failed.</span>');
-          });
-      });
-
-      reindexBtn.addEventListener('click', () => {
-        const p = (pathEl.value || '').trim();
-        if (!p) {
-          alert('Enter ' + appName + ' DB path.');
-          return;
-        }
-        reindexBtn.disabled = true;
-        showResult('<span class="sub">Running REINDEX… (stop ' + appName + ' first)</span>');
-        fetch(api + '/reindex', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ path: p })
-        })
-          .then(r => r.json())
-          .then(d => {
-            reindexBtn.disabled = false;
-            if (d.ok) showResult('<span style="color: var(--success);">' + (d.message || 'REINDEX completed.') + '</span>');
-            else showResult('<span style="color: var(--danger);">' + (d.error || 'REINDEX failed.') + '</span>');
-          })
-          .catch(() => {
-            reindexBtn.disabled = false;
-            showResult('<span style="color: var(--danger);">Request failed.</span>');
-          });
-      });
-    }
-
-    wireArrTab({
-      api: '/radarr',
-      mySource: 'radarr',
-      appName: 'Radarr',
-      peerName: 'Sonarr',
-      pathId: 'radarr_path',
-      outId: 'radarr_output_path',
-      checkBtnId: 'radarrCheckBtn',
-      repairBtnId: 'radarrRepairBtn',
-      vacuumBtnId: 'radarrVacuumBtn',
-      reindexBtnId: 'radarrReindexBtn',
-      checkResultId: 'radarrCheckResult',
-      repairStatusId: 'radarrRepairStatus',
-      logBoxId: 'radarrLogBox',
-    });
-    wireArrTab({
-      api: '/sonarr',
-      mySource: 'sonarr',
-      appName: 'Sonarr',
-      peerName: 'Radarr',
-      pathId: 'sonarr_path',
-      outId: 'sonarr_output_path',
-      checkBtnId: 'sonarrCheckBtn',
-      repairBtnId: 'sonarrRepairBtn',
-      vacuumBtnId: 'sonarrVacuumBtn',
-      reindexBtnId: 'sonarrReindexBtn',
-      checkResultId: 'sonarrCheckResult',
-      repairStatusId: 'sonarrRepairStatus',
-      logBoxId: 'sonarrLogBox',
-    });
-
-    if (checkPath && checkBtn && checkResult) {
-      checkBtn.addEventListener('click', () => {
-        let p = (checkPath.value || '').trim();
-        if (!p) p = (outputPath.value || newPath.value || oldPath.value || '').trim();
-        if (!p) {
-          alert('Enter a DB path to check (or fill one of the Old/New/Output fields).');
-          return;
-        }
-        checkPath.value = p;
-        checkBtn.disabled = true;
-        checkResult.style.display = 'block';
-        checkResult.innerHTML = '<span class="sub">Running PRAGMA integrity_check…</span>';
-        fetch('/integrity_check', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ path: p })
-        })
-          .then(r => r.json())
-          .then(d => {
-            checkBtn.disabled = false;
-            const msgs = d.messages || [];
-            if (d.error && !msgs.length && !d.ok) {
-              checkResult.innerHTML = '<span style="color: var(--danger);">' + d.error + '</span>';
-              return;
-            }
-            if (d.ok && msgs.length === 1 && msgs[0].toLowerCase() === 'ok') {
-              checkResult.innerHTML = '<span style="color: var(--success);">integrity_check: OK</span>';
-              return;
-            }
-            let html = '';
-            if (d.error) html += '<span style="color: var(--danger);">' + d.error + '</span><br>';
-            if (msgs.length) html += '<strong>integrity_check reported ' + msgs.length + ' issue(s):</strong><br><pre class="sub" style="margin-top:0.5rem; white-space:pre-wrap; max-height:12rem; overflow:auto; border:1px solid var(--border); padding:0.5rem;">' + msgs.join('\\n') + '</pre>';
-            checkResult.innerHTML = html || '<span class="sub">No output from integrity_check.</span>';
-          })
-          .catch(() => {
-            checkBtn.disabled = false;
-            checkResult.innerHTML = '<span style="color: var(--danger);">Request failed.</span>';
-          });
-      });
-    }
-  </script>
-</body>
-</html>
-"""
+# The page template lives in templates/index.html; it only interpolates the
+# version, which is fixed for the process lifetime, so render it exactly
+# once at import and serve the cached bytes.
+with app.app_context():
+    _index_html = render_template("index.html", version=APP_VERSION)
+try:
+    # Optional: strip comments and inter-tag whitespace once at import.
+    # Script/style bodies are left alone, so the inline JS is safe.
+    import htmlmin
+    _index_html = htmlmin.minify(_index_html, remove_comments=True, remove_empty_space=True)
+except ImportError:
+    pass
+_INDEX_BODY = _index_html.encode("utf-8")
+del _index_html
+# Pre-compress too: the page is ~60 KB of inline CSS/JS and every browser
+# sends Accept-Encoding: gzip, so compressing once at import beats doing it
+# (or sending it uncompressed) per request.
+_INDEX_BODY_GZ = gzip.compress(_INDEX_BODY, 9)
+_INDEX_ETAG = f'"{hashlib.md5(_INDEX_BODY).hexdigest()}"'
 
 
 if __name__ == "__main__":
@@ -1480,10 +862,23 @@ if __name__ == "__main__":
     _p = _ap.ArgumentParser(description="Plex DB Merge web UI")
     _p.add_argument("--host", default="0.0.0.0", help="Bind address (use 127.0.0.1 for local-only)")
     _p.add_argument("--port", type=int, default=5000, help="Port (default 5000)")
+    _p.add_argument("--dev", action="store_true", help="Use Flask's built-in dev server instead of waitress")
     _args = _p.parse_args()
     # Log to stdout so docker logs shows why it's not working (e.g. bind address, paths)
     print(f"[Plex DB Merge] Starting: host={_args.host!r} port={_args.port} BROWSE_ROOT={BROWSE_ROOT!r}", flush=True)
     print(f"[Plex DB Merge] If you cannot reach the UI, ensure host is 0.0.0.0 and the container port is mapped (e.g. -p 2000:5000).", flush=True)
     sys.stdout.flush()
     sys.stderr.flush()
-    app.run(host=_args.host, port=_args.port, debug=False, threaded=True)
+    if _args.dev:
+        app.run(host=_args.host, port=_args.port, debug=False, threaded=True)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            # waitress is in requirements.txt but keep working without it
+            print("[Plex DB Merge] waitress not installed; falling back to the Flask dev server.", flush=True)
+            app.run(host=_args.host, port=_args.port, debug=False, threaded=True)
+        else:
+            # More threads than the default 4: /events streams and long-polls
+            # each hold a thread while they wait.
+            serve(app, host=_args.host, port=_args.port, threads=16)
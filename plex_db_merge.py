@@ -19,6 +19,8 @@ Requires: Python 3.6+, no extra packages (uses sqlite3). Optional: sqlite3 CLI f
 """
 
 import argparse
+import collections
+import json
 import os
 import re
 import shutil
@@ -29,11 +31,37 @@ import tempfile
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Iterable, Iterator
 
 # Optional callback for UI/API (e.g. log_callback(msg) -> None)
 _log_callback: Callable[[str], None] | None = None
 
+# Single-letter drive prefix, e.g. C:/ or C: (see _normalize_path).
+_WIN_DRIVE_RE = re.compile(r"^([a-zA-Z]):(.*)$")
+
+# Plex's FTS tables use a custom "collating" tokenizer that vanilla SQLite
+# doesn't have, so their CREATE VIRTUAL TABLE (and every INSERT after it)
+# fails during recovery imports. Rewriting to the built-in simple tokenizer
+# lets the table and its rows come through; Plex rebuilds its FTS data anyway.
+_FTS_TOKENIZE_RE = re.compile(r"(tokenize\s*=?\s*)collating\w*", re.IGNORECASE)
+
+# First identifier of a CREATE TABLE / INSERT statement, for allowlist
+# filtering during recovery imports.
+_STMT_TARGET_RE = re.compile(
+    r'^(?:CREATE\s+(?:VIRTUAL\s+)?TABLE(?:\s+IF\s+NOT\s+EXISTS)?|'
+    r'INSERT(?:\s+OR\s+\w+)?\s+INTO)\s+["\[]?(\w+)',
+    re.IGNORECASE,
+)
+
+# The only tables the merge ever reads from the new/corrupt DB. Recovering
+# just these makes the rebuild a fraction of the full dump. Never applied to
+# a DB that has to stay complete (the old backup, or arr databases).
+MERGE_TABLES = frozenset({
+    "metadata_items", "metadata_item_views", "metadata_item_settings",
+    "media_items", "media_parts", "media_streams", "library_sections",
+    "sqlite_sequence",
+})
+
 
 def log(msg: str) -> None:
     ts = datetime.now().strftime("%Y-%m-%d %H.%M.%S")
@@ -44,19 +72,80 @@ def log(msg: str) -> None:
         print(line, flush=True)
 
 
+def _fast_copy(src: str, dst: str) -> None:
+    """
+    Copy src to dst, taking the cheapest route the filesystem offers: a
+    reflink clone (instant on btrfs/XFS) first, then copy_file_range (in-kernel
+    copy, no userspace round-trip), then plain shutil.copy2. Plex libraries are
+    routinely multi-GB, so the fast paths matter. Metadata is copied last
+    either way so dst keeps src's timestamps like copy2 would.
+    """
+    try:
+        subprocess.run(
+            ["cp", "--reflink=auto", "--", src, dst],
+            check=True, capture_output=True,
+        )
+        shutil.copystat(src, dst)
+        return
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        size = os.path.getsize(src)
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            copied = 0
+            while copied < size:
+                n = os.copy_file_range(s.fileno(), d.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+        if copied >= size:
+            shutil.copystat(src, dst)
+            return
+    except (OSError, AttributeError):
+        pass
+    shutil.copy2(src, dst)
+
+
 def _normalize_path(path: str) -> str:
     """Normalize path (strip, and convert Windows-style drive paths to Linux if on Linux)."""
     if not path or os.name == "nt":
         return path.strip()
     p = path.strip().replace("\\", "/")
-    # Match single letter drive: C:/ or C:
-    m = re.match(r"^([a-zA-Z]):(.*)$", p)
+    m = _WIN_DRIVE_RE.match(p)
     if m:
         drive, rest = m.group(1).lower(), m.group(2).lstrip("/")
         return f"/mnt/{drive}/{rest}" if rest else f"/mnt/{drive}"
     return p
 
 
+def _open_or_recover(
+    path: str,
+    allow_recover: bool = True,
+    only_tables: frozenset[str] | None = None,
+) -> tuple[sqlite3.Connection | None, str | None]:
+    """
+    Open path read-only, recovering into a temp file when the direct open
+    fails and allow_recover is set. Returns (conn, recovered_path):
+    recovered_path is a temp file the caller must unlink once done with the
+    connection (it backs the connection for the rest of the run), or None
+    when the DB opened directly. (None, None) means the DB is unusable.
+    """
+    conn = try_open_db(path)
+    if conn or not allow_recover:
+        return conn, None
+    log("DB could not be opened directly. Recovering (can take 10–20 min for large DBs)…")
+    fd, tmp = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    if recover_db(path, tmp, only_tables=only_tables):
+        conn = try_open_db(tmp)
+        if conn:
+            log("Recovered DB and opened it.")
+            return conn, tmp
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    return None, None
+
+
 def run_merge(
     old_path: str,
     new_path: str,
@@ -64,11 +153,14 @@ def run_merge(
     *,
     recover: bool = False,
     merge_new_items: bool = False,
+    verify: bool = False,
     log_callback: Callable[[str], None] | None = None,
 ) -> tuple[bool, str | None]:
     """
     Run the merge. Returns (success, error_message).
     If log_callback is provided, all log lines are sent there instead of stdout.
+    verify runs a full PRAGMA integrity_check on the output — a whole-DB scan
+    that can take minutes on large libraries, so it's opt-in.
     """
     global _log_callback
     _log_callback = log_callback
@@ -82,69 +174,84 @@ def run_merge(
                 log(f"File not found: {p}")
                 return False, f"File not found: {p}"
 
-        recovered_old_path = None
         log("Opening old (backup) DB…")
-        old_conn = try_open_db(old_path)
+        old_conn, recovered_old_path = _open_or_recover(old_path)
         if not old_conn:
-            log("Old DB could not be opened directly. Recovering (can take 10–20 min for large DBs)…")
-            fd, recovered_old_path = tempfile.mkstemp(suffix=".db")
-            os.close(fd)
-            if recover_db(old_path, recovered_old_path):
-                old_conn = try_open_db(recovered_old_path)
-            if not old_conn:
-                if recovered_old_path and os.path.exists(recovered_old_path):
-                    os.unlink(recovered_old_path)
-                log("Cannot open old DB. Aborting.")
-                return False, "Cannot open old (backup) DB. Install sqlite3 CLI and try again."
-            log("Opened old DB via recovery.")
-
-        shutil.copy2(old_path if not recovered_old_path else recovered_old_path, output_path)
-        out_conn = sqlite3.connect(output_path)
+            log("Cannot open old DB. Aborting.")
+            return False, "Cannot open old (backup) DB. Install sqlite3 CLI and try again."
+
+        _fast_copy(old_path if not recovered_old_path else recovered_old_path, output_path)
+        # cached_statements above the default 100 so none of the merge's
+        # prepared statements get evicted mid-run.
+        out_conn = sqlite3.connect(output_path, cached_statements=256)
         out_conn.execute("PRAGMA foreign_keys = OFF")
+        # Bulk-load settings for the merge: the output is a throwaway copy of
+        # the backup until the merge finishes — a crash mid-run means re-running
+        # from the backup, not data loss — so journaling and fsyncs buy nothing
+        # here. Turn both off for raw write bandwidth, take the file lock once,
+        # and keep the insert working set in memory. Durable settings are
+        # restored before close (below) so Plex sees its usual on-disk format.
+        out_conn.executescript(
+            "PRAGMA journal_mode=OFF;"
+            "PRAGMA synchronous=OFF;"
+            "PRAGMA locking_mode=EXCLUSIVE;"
+            "PRAGMA temp_store=MEMORY;"
+            "PRAGMA cache_size=-131072;"
+        )
         log(f"Created writable copy at {output_path}")
 
-        recovered_path = None
         log("Opening new/corrupt DB…")
-        new_conn = try_open_db(new_path)
-        if not new_conn and recover:
-            log("New DB could not be opened. Recovering (can take 10–20 min for large DBs)…")
-            fd, recovered_path = tempfile.mkstemp(suffix=".db")
-            os.close(fd)
-            if recover_db(new_path, recovered_path):
-                new_conn = try_open_db(recovered_path)
-                if new_conn:
-                    log("Recovered new DB and opened it.")
-            if recovered_path and os.path.exists(recovered_path) and not new_conn:
-                os.unlink(recovered_path)
-                recovered_path = None
-        if not new_conn:
-            new_conn = try_open_db(new_path)
+        new_conn, recovered_path = _open_or_recover(
+            new_path, allow_recover=recover, only_tables=MERGE_TABLES
+        )
         if not new_conn:
             log("Cannot open new (corrupt) DB. Try enabling recover or run sqlite3 .recover manually.")
-            if recovered_path and os.path.exists(recovered_path):
-                os.unlink(recovered_path)
             return False, "Cannot open new (corrupt) DB. Enable 'Recover corrupt DB' and try again."
 
+        # Effective on-disk path of the new DB (recovery swaps in a temp file);
+        # lets the watch-history merge run as ATTACH + INSERT…SELECT.
+        new_effective_path = recovered_path if recovered_path else new_path
+
         try:
-            views_added, settings_added = merge_watch_history_and_settings(old_conn, new_conn, out_conn)
+            views_added, settings_added = merge_watch_history_and_settings(
+                old_conn, new_conn, out_conn, new_db_path=new_effective_path
+            )
             log(f"Merged watch history: {views_added} views, {settings_added} settings.")
 
             meta_added = 0
             if merge_new_items:
-                meta_added = merge_new_library_items(old_conn, new_conn, out_conn)
+                meta_added = merge_new_library_items(
+                    old_conn, new_conn, out_conn, new_db_path=new_effective_path
+                )
                 log(f"Merged new library items: {meta_added} metadata_items.")
 
-            ok_ic, messages_ic, err_ic = run_pragma_integrity_check(output_path)
-            if err_ic:
-                log(f"Output DB integrity check failed: {err_ic}")
-            elif ok_ic:
-                log("Output DB integrity check: ok.")
-            elif messages_ic:
-                log("Output DB integrity_check reported issues:")
-                for msg in messages_ic:
-                    log(f"  - {msg}")
-            else:
-                log("Output DB integrity_check returned no rows.")
+            # Restore durable, ordinary-file settings so the output is a
+            # normal standalone .db with everything synced to disk.
+            try:
+                out_conn.execute("DROP INDEX IF EXISTS tmp_plexdb_mi_guid")
+                # Back to NORMAL locking; the journal_mode change below is the
+                # file access that actually releases the exclusive lock, so
+                # the --verify connection (and Plex) can open the output.
+                out_conn.execute("PRAGMA locking_mode=NORMAL")
+                out_conn.execute("PRAGMA journal_mode=DELETE")
+                out_conn.execute("PRAGMA synchronous=FULL")
+                out_conn.execute("PRAGMA optimize")
+                out_conn.commit()
+            except sqlite3.Error as e:
+                log(f"Warning: could not restore journal mode on output DB: {e}")
+
+            if verify:
+                ok_ic, messages_ic, err_ic = run_pragma_integrity_check(output_path)
+                if err_ic:
+                    log(f"Output DB integrity check failed: {err_ic}")
+                elif ok_ic:
+                    log("Output DB integrity check: ok.")
+                elif messages_ic:
+                    log("Output DB integrity_check reported issues:")
+                    for msg in messages_ic:
+                        log(f"  - {msg}")
+                else:
+                    log("Output DB integrity_check returned no rows.")
         finally:
             old_conn.close()
             new_conn.close()
@@ -153,6 +260,7 @@ def run_merge(
                 os.unlink(recovered_path)
             if recovered_old_path and os.path.exists(recovered_old_path):
                 os.unlink(recovered_old_path)
+            _schema_cache_clear()
 
         log("Done. Replace your Plex DB with the output file (with Plex stopped), then start Plex.")
         return True, None
@@ -196,20 +304,10 @@ def preview_merge(
     for p in (old_path, new_path):
         if not os.path.isfile(p):
             return False, f"File not found: {p}", stats
-    recovered_old_path = None
     log("Opening old (backup) DB…")
-    old_conn = try_open_db(old_path)
+    old_conn, recovered_old_path = _open_or_recover(old_path)
     if not old_conn:
-        log("Old DB could not be opened directly. Recovering (can take 10–20 min for large DBs)…")
-        fd, recovered_old_path = tempfile.mkstemp(suffix=".db")
-        os.close(fd)
-        if recover_db(old_path, recovered_old_path):
-            log("Old DB recovery finished. Opening…")
-            old_conn = try_open_db(recovered_old_path)
-        if not old_conn:
-            if recovered_old_path and os.path.exists(recovered_old_path):
-                os.unlink(recovered_old_path)
-            return False, "Cannot open old (backup) DB. Install sqlite3 CLI (apt install sqlite3) and try again.", stats
+        return False, "Cannot open old (backup) DB. Install sqlite3 CLI (apt install sqlite3) and try again.", stats
     log("Old DB open.")
     # Effective on-disk path for attaching old DB later (handles recovery).
     old_effective_path = recovered_old_path if recovered_old_path else old_path
@@ -223,24 +321,11 @@ def preview_merge(
             stats["old_settings_total"] = int(r[0]) if r and r[0] is not None else 0
     except sqlite3.Error as e:
         log(f"Warning: failed to count rows in old DB: {e}")
-    recovered_path = None
     log("Opening new/corrupt DB…")
-    new_conn = try_open_db(new_path)
-    if not new_conn and recover:
-        log("New DB could not be opened. Recovering (can take 10–20 min for large DBs)…")
-        fd, recovered_path = tempfile.mkstemp(suffix=".db")
-        os.close(fd)
-        if recover_db(new_path, recovered_path):
-            log("New DB recovery finished. Opening…")
-            new_conn = try_open_db(recovered_path)
-        if recovered_path and os.path.exists(recovered_path) and not new_conn:
-            os.unlink(recovered_path)
-            recovered_path = None
-    if not new_conn:
-        new_conn = try_open_db(new_path)
+    new_conn, recovered_path = _open_or_recover(
+        new_path, allow_recover=recover, only_tables=MERGE_TABLES
+    )
     if not new_conn:
-        if recovered_path and os.path.exists(recovered_path):
-            os.unlink(recovered_path)
         return False, "Cannot open new (corrupt) DB. Enable 'Try to recover corrupt DB' and try again.", stats
     log("New DB open. Counting watch history and settings…")
     # Effective on-disk path for attaching old DB later (handles recovery).
@@ -266,12 +351,6 @@ def preview_merge(
         if not table_exists(o_conn, "metadata_items"):
             return
 
-        # Build guid -> id map from old DB (used for mapping + filtering)
-        cur = o_conn.execute(
-            "SELECT id, guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
-        )
-        guid_to_id_old = {row[1]: row[0] for row in cur.fetchall()}
-
         # Views/settings "to add" are best approximated by table growth
         # (new older/ newer deltas are small in your case).
         stats["views_to_add"] = max(0, stats.get("new_views_total", 0) - stats.get("old_views_total", 0))
@@ -376,11 +455,37 @@ def preview_merge(
             log(f"Warning: could not build watch row preview sample: {type(e).__name__}: {e}")
 
         if merge_new_items and table_exists(n_conn, "metadata_items"):
-            cur = n_conn.execute(
-                "SELECT guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
-            )
-            new_guids = {row[0] for row in cur.fetchall()}
-            stats["new_metadata_items_to_add"] = len(new_guids - set(guid_to_id_old.keys()))
+            # Count inside SQLite with the old DB attached — no need to haul
+            # both guid columns into Python sets just for a difference.
+            try:
+                n_conn.execute(f"ATTACH DATABASE 'file:{old_effective_path}?mode=ro' AS oldcnt")
+                try:
+                    stats["new_metadata_items_to_add"] = n_conn.execute(
+                        "SELECT COUNT(DISTINCT guid) FROM metadata_items "
+                        "WHERE guid IS NOT NULL AND guid != '' "
+                        "AND guid NOT IN (SELECT guid FROM oldcnt.metadata_items "
+                        "WHERE guid IS NOT NULL AND guid != '')"
+                    ).fetchone()[0]
+                finally:
+                    try:
+                        n_conn.execute("DETACH DATABASE oldcnt")
+                    except sqlite3.Error:
+                        pass
+            except sqlite3.Error:
+                # Attach can fail (e.g. locked old DB); fall back to set math.
+                old_guids = {
+                    row[0]
+                    for row in o_conn.execute(
+                        "SELECT guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
+                    )
+                }
+                new_guids = {
+                    row[0]
+                    for row in n_conn.execute(
+                        "SELECT guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
+                    )
+                }
+                stats["new_metadata_items_to_add"] = len(new_guids - old_guids)
 
     try:
         _count_stats(old_conn, new_conn)
@@ -400,7 +505,9 @@ def preview_merge(
         os.close(fd1)
         fd2, recovered_path = tempfile.mkstemp(suffix=".db")
         os.close(fd2)
-        if not recover_db(old_path, recovered_old_path) or not recover_db(new_path, recovered_path):
+        if not recover_db(old_path, recovered_old_path) or not recover_db(
+            new_path, recovered_path, only_tables=MERGE_TABLES
+        ):
             if recovered_old_path and os.path.exists(recovered_old_path):
                 os.unlink(recovered_old_path)
             if recovered_path and os.path.exists(recovered_path):
@@ -442,6 +549,7 @@ def preview_merge(
             os.unlink(recovered_path)
         if recovered_old_path and os.path.exists(recovered_old_path):
             os.unlink(recovered_old_path)
+        _schema_cache_clear()
     return True, None, stats
 
 
@@ -451,6 +559,13 @@ def try_open_db(path: str, skip_integrity_check: bool = True) -> sqlite3.Connect
     integrity_check so we don't touch those; we only read metadata tables."""
     try:
         conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        # Belt and braces on top of mode=ro: query_only also blocks writes
+        # opened through this handle's temp/journal paths. mmap lets large
+        # guid scans read straight from the page cache; the negative
+        # cache_size is KiB (32 MiB here).
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA mmap_size=1073741824")
+        conn.execute("PRAGMA cache_size=-32768")
         if not skip_integrity_check:
             conn.execute("PRAGMA integrity_check").fetchone()
         return conn
@@ -584,76 +699,98 @@ def _sqlite3_cmd() -> list[str]:
     return ["sqlite3"]
 
 
-def _import_sql_skipping_errors(sql_path: str, out_path: str) -> bool:
+def _import_sql_skipping_errors(
+    sql_path: str, out_path: str, only_tables: frozenset[str] | None = None
+) -> bool:
     """
     Import SQL file into a new DB, executing statement by statement and skipping
     any that fail (e.g. corrupt "(null);" from .recover). Processes line-by-line to
     avoid loading the whole file into memory. Returns True if the DB was created.
+    only_tables restricts CREATE TABLE / INSERT statements to the given table
+    names (dropping the bulk of the dump when only a few tables matter).
     """
     if os.path.exists(out_path):
         os.unlink(out_path)
     conn = sqlite3.connect(out_path)
+    # The rebuilt DB is scratch output until the import succeeds, so run it
+    # like the merge's bulk load: no journal, no fsyncs, exclusive lock, big
+    # cache. Manage transactions by hand and commit in 25k-statement batches
+    # instead of one implicit transaction per statement.
+    conn.isolation_level = None
+    conn.executescript(
+        "PRAGMA journal_mode=OFF;"
+        "PRAGMA synchronous=OFF;"
+        "PRAGMA locking_mode=EXCLUSIVE;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA cache_size=-131072;"
+    )
+    conn.execute("BEGIN")
     executed = 0
     skipped = 0
+    rewritten = 0
+    filtered = 0
     buffer: list[str] = []
-    in_single = in_double = False
     last_log_time = time.monotonic()
     last_log_executed = 0
 
-    def _semicolon_outside_string(s: str) -> bool:
-        """True if the last semicolon in s is outside any string literal."""
-        in_s, in_d = False, False
-        for i, c in enumerate(s):
-            if in_s:
-                if c == "'" and (i + 1 >= len(s) or s[i + 1] != "'"):
-                    in_s = False
-            elif in_d:
-                if c == '"' and (i + 1 >= len(s) or s[i + 1] != '"'):
-                    in_d = False
-            elif c == "'":
-                in_s = True
-            elif c == '"':
-                in_d = True
-            elif c == ";":
-                if not in_s and not in_d:
-                    return True
-        return False
-
     try:
         with open(sql_path, "r", encoding="utf-8", errors="replace") as f:
             for line in f:
-                buffer.append(line)
-                content = "".join(buffer)
-                if _semicolon_outside_string(content):
-                    stmt = content.strip()
-                    buffer = []
-                    in_single = in_double = False
-                    if not stmt or stmt.startswith("--"):
+                # Fast path: most .recover output is one INSERT per line, so
+                # with an empty buffer a self-contained line needs no append
+                # or join at all.
+                if not buffer:
+                    if ";" in line and sqlite3.complete_statement(line):
+                        content = line
+                    else:
+                        buffer.append(line)
                         continue
-                    try:
-                        conn.execute(stmt)
-                        executed += 1
-                        # Progress: log every 25k statements or every 45s
-                        now = time.monotonic()
-                        if executed - last_log_executed >= 25000 or (now - last_log_time) >= 45:
-                            log(f"Import progress: {executed} statements executed, {skipped} skipped…")
-                            last_log_executed = executed
-                            last_log_time = now
-                    except (sqlite3.OperationalError, sqlite3.ProgrammingError):
-                        skipped += 1
+                else:
+                    buffer.append(line)
+                    # Only a line carrying a semicolon can have closed the
+                    # statement; skipping the join otherwise keeps
+                    # accumulation linear on long multi-line literals.
+                    if ";" not in line:
+                        continue
+                    content = "".join(buffer)
+                    # complete_statement is the C-level boundary check the
+                    # sqlite3 shell itself uses (string literals, comments
+                    # and all).
+                    if not sqlite3.complete_statement(content):
+                        continue
+                    buffer = []
+                stmt = content.strip()
+                # A comment-only buffer never reads as complete (the ';' sits
+                # inside the comment), so comments arrive glued to the next
+                # statement; execute() accepts them as a leading prefix.
+                if not stmt:
                     continue
-                # Update quote state for next iteration
-                for i, c in enumerate(line):
-                    if in_single:
-                        if c == "'" and (i + 1 >= len(line) or line[i + 1] != "'"):
-                            in_single = False
-                    elif in_double:
-                        if c == '"' and (i + 1 >= len(line) or line[i + 1] != '"'):
-                            in_double = False
-                    elif c == "'":
-                        in_single = True
-                    elif c == '"':
-                        in_double = True
+                if only_tables is not None:
+                    target = _STMT_TARGET_RE.match(stmt)
+                    if target and target.group(1).lower() not in only_tables:
+                        filtered += 1
+                        continue
+                if stmt[:20].upper() == "CREATE VIRTUAL TABLE":
+                    stmt, n = _FTS_TOKENIZE_RE.subn(r"\1simple", stmt)
+                    rewritten += n
+                try:
+                    conn.execute(stmt)
+                    executed += 1
+                    if executed % 25000 == 0:
+                        conn.execute("COMMIT")
+                        conn.execute("BEGIN")
+                    # Progress: log every 25k statements or every 45s
+                    now = time.monotonic()
+                    if executed - last_log_executed >= 25000 or (now - last_log_time) >= 45:
+                        log(f"Import progress: {executed} statements executed, {skipped} skipped…")
+                        last_log_executed = executed
+                        last_log_time = now
+                except (sqlite3.OperationalError, sqlite3.ProgrammingError):
+                    skipped += 1
+                    # A failed statement can occasionally abort the whole
+                    # transaction; reopen it so later statements still batch.
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN")
         if buffer:
             stmt = "".join(buffer).strip()
             if stmt and not stmt.startswith("--"):
@@ -666,14 +803,76 @@ def _import_sql_skipping_errors(sql_path: str, out_path: str) -> bool:
         log(f"Error reading SQL file: {e}")
         conn.close()
         return False
-    conn.commit()
+    if conn.in_transaction:
+        conn.execute("COMMIT")
     conn.close()
+    if rewritten:
+        log(f"Rewrote {rewritten} custom FTS tokenizer reference(s) to 'simple'.")
+    if filtered:
+        log(f"Filtered {filtered} statements for tables outside the merge set.")
     log(f"Imported {executed} statements, skipped {skipped} bad ones.")
     return executed > 0
 
 
-def recover_db(path: str, out_path: str) -> bool:
-    """Salvage data into out_path using .recover or, if unavailable, .dump. Returns True on success."""
+# Bulk-load settings for the sqlite3 CLI process that rebuilds a DB from
+# dumped SQL; -cmd runs each pragma before stdin is read. The dump itself
+# wraps everything in one BEGIN…COMMIT, so only journaling/sync/cache need
+# taming here.
+_REBUILD_CLI_PRAGMAS = [
+    "-cmd", "PRAGMA journal_mode=OFF",
+    "-cmd", "PRAGMA synchronous=OFF",
+    "-cmd", "PRAGMA temp_store=MEMORY",
+    "-cmd", "PRAGMA cache_size=-131072",
+]
+
+
+def _recover_piped(sqlite3_cmd: list[str], path: str, out_path: str) -> bool:
+    """
+    Fast path: pipe `.recover` output straight into the rebuilding sqlite3
+    process, so the SQL dump (often several times the DB size) never touches
+    disk. Returns False on any failure; the caller then retries through the
+    temp-file flow, which can route around missing .recover support and
+    parse errors in the dump.
+    """
+    log("Running sqlite3 .recover piped into rebuild (this may take 10–20 min for large DBs)…")
+    # p1 stderr goes to DEVNULL: holding it in a pipe nobody drains could
+    # stall p1 and deadlock the pair. The file-based retry reports errors.
+    p1 = subprocess.Popen(
+        sqlite3_cmd + [path, ".recover"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    p2 = subprocess.Popen(
+        sqlite3_cmd + _REBUILD_CLI_PRAGMAS + [out_path],
+        stdin=p1.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    p1.stdout.close()  # so p1 sees SIGPIPE if p2 dies early
+    try:
+        _, err2 = p2.communicate(timeout=1800)
+        rc1 = p1.wait(timeout=900)
+    except subprocess.TimeoutExpired:
+        p1.kill()
+        p2.kill()
+        p1.wait()
+        p2.wait()
+        log("Piped recovery timed out; falling back to file-based recovery.")
+        return False
+    if rc1 == 0 and p2.returncode == 0:
+        log("Recovery complete (piped).")
+        return True
+    stderr = (err2 or b"").decode("utf-8", errors="replace")
+    log(f"Piped recovery failed (recover rc={rc1}, rebuild rc={p2.returncode}); falling back to file-based recovery.")
+    if stderr:
+        log(f"rebuild stderr: {stderr[:500]}")
+    return False
+
+
+def recover_db(
+    path: str, out_path: str, only_tables: frozenset[str] | None = None
+) -> bool:
+    """Salvage data into out_path using .recover or, if unavailable, .dump. Returns True on success.
+    only_tables narrows the statement-by-statement import to the given tables;
+    only pass it for a DB the caller reads selectively, never for one that has
+    to come out complete."""
     sqlite3_cmd = _sqlite3_cmd()
     tmpdir = _recovery_tmpdir(out_path)
     if tmpdir:
@@ -682,6 +881,13 @@ def recover_db(path: str, out_path: str) -> bool:
         if n:
             log(f"Freed space: removed {n} old recovery file(s).")
     try:
+        if _recover_piped(sqlite3_cmd, path, out_path):
+            return True
+        # Don't let a half-written DB from the piped attempt survive into
+        # the retry below.
+        if os.path.exists(out_path):
+            os.unlink(out_path)
+
         with tempfile.NamedTemporaryFile(suffix=".sql", delete=False, dir=tmpdir) as f:
             sql_path = f.name
         use_dump = False
@@ -728,7 +934,7 @@ def recover_db(path: str, out_path: str) -> bool:
         log("Writing recovered DB (may take several minutes)…")
         with open(sql_path, "rb") as f:
             r = subprocess.run(
-                sqlite3_cmd + [out_path],
+                sqlite3_cmd + _REBUILD_CLI_PRAGMAS + [out_path],
                 stdin=f,
                 capture_output=True,
                 timeout=1800,
@@ -738,7 +944,7 @@ def recover_db(path: str, out_path: str) -> bool:
             if "Parse error" in stderr or "syntax error" in stderr:
                 log("Recovered SQL has parse errors (corrupt data). Trying to import what we can, skipping bad statements…")
                 log("(This rebuilds the new DB so we can compare it to the old one; the dump can be millions of statements and may take a long time.)")
-                if _import_sql_skipping_errors(sql_path, out_path):
+                if _import_sql_skipping_errors(sql_path, out_path, only_tables=only_tables):
                     os.unlink(sql_path)
                     log("Recovery complete (partial; some rows were skipped).")
                     return True
@@ -758,26 +964,309 @@ def recover_db(path: str, out_path: str) -> bool:
         return False
 
 
+# Max ids per parameterized IN (...) list. Keeps statements small enough to
+# parse cheaply and stay clear of SQLite's expression limits.
+_IN_CHUNK = 500
+
+
+def _select_in_chunks(conn: sqlite3.Connection, sql: str, ids: Iterable[int]) -> Iterator[tuple]:
+    """
+    Run `sql` — which must contain an ``IN ({placeholders})`` slot — for the
+    given ids, yielding rows. Prefers json_each: the whole id set travels as
+    one JSON parameter, the SQL text stays constant (so the prepared
+    statement caches) and SQLite builds a transient index over the values
+    for the IN test. Falls back to ?-parameter chunks of _IN_CHUNK when the
+    json1 table-valued function isn't available.
+    """
+    ids = sorted(ids)
+    try:
+        cur = conn.execute(
+            sql.format(placeholders="SELECT value FROM json_each(?)"), (json.dumps(ids),)
+        )
+    except sqlite3.OperationalError:
+        for i in range(0, len(ids), _IN_CHUNK):
+            batch = ids[i:i + _IN_CHUNK]
+            yield from conn.execute(sql.format(placeholders=",".join("?" * len(batch))), batch)
+        return
+    yield from cur
+
+
+def _quote(col: str) -> str:
+    """Bracket-quote Plex column names that collide with SQL keywords."""
+    return f"[{col}]" if col in ("index", "default") else col
+
+
+def _cols(cols: tuple[str, ...]) -> str:
+    return ", ".join(_quote(c) for c in cols)
+
+
+def _marks(cols: tuple[str, ...]) -> str:
+    return ",".join("?" * len(cols))
+
+
+# Column lists for the tables we copy, fixed at module import. The SQL built
+# from them below is constructed once, so every merge reuses the exact same
+# statement text and sqlite3's statement cache can actually hit.
+META_COLS = (
+    "id", "library_section_id", "parent_id", "metadata_type", "guid", "media_item_count",
+    "title", "title_sort", "original_title", "studio", "rating", "rating_count", "tagline",
+    "summary", "trivia", "quotes", "content_rating", "content_rating_age", "index",
+    "absolute_index", "duration", "user_thumb_url", "user_art_url", "user_banner_url",
+    "user_music_url", "user_fields", "tags_genre", "tags_collection", "tags_director",
+    "tags_writer", "tags_star", "originally_available_at", "available_at", "expires_at",
+    "refreshed_at", "year", "added_at", "created_at", "updated_at", "deleted_at",
+    "tags_country", "extra_data", "hash", "audience_rating", "changed_at",
+    "resources_changed_at", "remote",
+)
+MEDIA_ITEMS_COLS = (
+    "id", "library_section_id", "section_location_id", "metadata_item_id", "type_id",
+    "width", "height", "size", "duration", "bitrate", "container", "video_codec",
+    "audio_codec", "display_aspect_ratio", "frames_per_second", "audio_channels",
+    "interlaced", "source", "hints", "display_offset", "settings", "created_at",
+    "updated_at", "optimized_for_streaming", "deleted_at", "media_analysis_version",
+    "sample_aspect_ratio", "extra_data", "proxy_type", "channel_id", "begins_at", "ends_at",
+)
+MEDIA_PARTS_COLS = (
+    "id", "media_item_id", "directory_id", "hash", "open_subtitle_hash", "file", "index",
+    "size", "duration", "created_at", "updated_at", "deleted_at", "extra_data",
+)
+MEDIA_STREAMS_COLS = (
+    "id", "stream_type_id", "media_item_id", "url", "codec", "language", "created_at",
+    "updated_at", "index", "media_part_id", "channels", "bitrate", "url_index", "default",
+    "forced", "extra_data",
+)
+VIEWS_COLS = (
+    "account_id", "guid", "metadata_type", "library_section_id", "grandparent_title",
+    "parent_index", "parent_title", "index", "title", "thumb_url", "viewed_at",
+    "grandparent_guid", "originally_available_at", "device_id",
+)
+SETTINGS_COLS = (
+    "account_id", "guid", "rating", "view_offset", "view_count", "last_viewed_at",
+    "created_at", "updated_at", "skip_count", "last_skipped_at", "changed_at", "extra_data",
+)
+
+META_SELECT_SQL = f"SELECT {_cols(META_COLS)} FROM metadata_items"
+META_INSERT_SQL = f"INSERT INTO metadata_items ({_cols(META_COLS)}) VALUES ({_marks(META_COLS)})"
+# The {placeholders} slot is filled per chunk by _select_in_chunks.
+MEDIA_ITEMS_SELECT_SQL = (
+    f"SELECT {_cols(MEDIA_ITEMS_COLS)} FROM media_items "
+    "WHERE metadata_item_id IN ({placeholders})"
+)
+MEDIA_ITEMS_INSERT_SQL = (
+    f"INSERT INTO media_items ({_cols(MEDIA_ITEMS_COLS)}) VALUES ({_marks(MEDIA_ITEMS_COLS)})"
+)
+MEDIA_PARTS_SELECT_SQL = (
+    f"SELECT {_cols(MEDIA_PARTS_COLS)} FROM media_parts "
+    "WHERE media_item_id IN ({placeholders})"
+)
+MEDIA_PARTS_INSERT_SQL = (
+    f"INSERT INTO media_parts ({_cols(MEDIA_PARTS_COLS)}) VALUES ({_marks(MEDIA_PARTS_COLS)})"
+)
+MEDIA_STREAMS_SELECT_SQL = (
+    f"SELECT {_cols(MEDIA_STREAMS_COLS)} FROM media_streams "
+    "WHERE media_item_id IN ({placeholders})"
+)
+MEDIA_STREAMS_INSERT_SQL = (
+    f"INSERT INTO media_streams ({_cols(MEDIA_STREAMS_COLS)}) VALUES ({_marks(MEDIA_STREAMS_COLS)})"
+)
+# SQL-side copies for the new-items merge: SELECT from the attached new DB
+# with ids swapped in from the temp map tables built by _copy_new_items_sql.
+# Only keep=1 metadata rows copy (keep=0 marks cycle/invalid-section rows,
+# which still resolve child references); the parent reference remaps through
+# a second join on the same map, falling back to the original value exactly
+# like the row-copy path.
+META_COPY_SQL = (
+    f"INSERT INTO main.metadata_items ({_cols(META_COLS)}) SELECT "
+    + ", ".join(
+        {"id": "mm.out_id", "parent_id": "COALESCE(pm.out_id, m.parent_id)"}.get(c, f"m.{_quote(c)}")
+        for c in META_COLS
+    )
+    + " FROM newdb.metadata_items m"
+    " JOIN tmp_plexdb_meta_map mm ON mm.new_id = m.id AND mm.keep = 1"
+    " LEFT JOIN tmp_plexdb_meta_map pm ON pm.new_id = m.parent_id"
+)
+MEDIA_ITEMS_COPY_SQL = (
+    f"INSERT INTO main.media_items ({_cols(MEDIA_ITEMS_COLS)}) SELECT "
+    + ", ".join(
+        {"id": "map.out_id", "metadata_item_id": "mm.out_id"}.get(c, f"mi.{_quote(c)}")
+        for c in MEDIA_ITEMS_COLS
+    )
+    + " FROM newdb.media_items mi"
+    " JOIN tmp_plexdb_media_map map ON map.new_id = mi.id"
+    " JOIN tmp_plexdb_meta_map mm ON mm.new_id = mi.metadata_item_id"
+)
+MEDIA_PARTS_COPY_SQL = (
+    f"INSERT INTO main.media_parts ({_cols(MEDIA_PARTS_COLS)}) SELECT "
+    + ", ".join(
+        {"id": "pm.out_id", "media_item_id": "m.out_id"}.get(c, f"p.{_quote(c)}")
+        for c in MEDIA_PARTS_COLS
+    )
+    + " FROM newdb.media_parts p"
+    " JOIN tmp_plexdb_media_map m ON m.new_id = p.media_item_id"
+    " JOIN tmp_plexdb_part_map pm ON pm.new_id = p.id"
+)
+# Stream ids are assigned inline (high-water mark bound as the single
+# parameter); an unmapped media_part_id passes through unchanged, matching
+# the row-copy path.
+MEDIA_STREAMS_COPY_SQL = (
+    f"INSERT INTO main.media_streams ({_cols(MEDIA_STREAMS_COLS)}) SELECT "
+    + ", ".join(
+        {
+            "id": "? + ROW_NUMBER() OVER (ORDER BY s.id)",
+            "media_item_id": "m.out_id",
+            "media_part_id": "COALESCE(pm.out_id, s.media_part_id)",
+        }.get(c, f"s.{_quote(c)}")
+        for c in MEDIA_STREAMS_COLS
+    )
+    + " FROM newdb.media_streams s"
+    " JOIN tmp_plexdb_media_map m ON m.new_id = s.media_item_id"
+    " LEFT JOIN tmp_plexdb_part_map pm ON pm.new_id = s.media_part_id"
+)
+VIEWS_SELECT_SQL = f"SELECT {_cols(VIEWS_COLS)} FROM metadata_item_views"
+VIEWS_SELECT_JOIN_SQL = (
+    "SELECT "
+    + ", ".join("m.guid" if c == "guid" else f"v.{_quote(c)}" for c in VIEWS_COLS)
+    + " FROM metadata_item_views v"
+    " JOIN metadata_items m ON v.metadata_item_id = m.id"
+    " WHERE m.guid IS NOT NULL AND m.guid != ''"
+)
+SETTINGS_SELECT_SQL = f"SELECT {_cols(SETTINGS_COLS)} FROM metadata_item_settings"
+SETTINGS_INSERT_SQL = (
+    f"INSERT OR REPLACE INTO metadata_item_settings ({_cols(SETTINGS_COLS)}) "
+    f"VALUES ({_marks(SETTINGS_COLS)})"
+)
+
+
+# Schema-introspection cache keyed by (id(conn), kind, table). Connections are
+# not hashable, but id() is stable for the lifetime of a merge; run_merge and
+# preview_merge clear the cache once their connections close so a recycled id
+# on a later run can't serve stale answers.
+_schema_cache: dict[tuple[int, str, str], object] = {}
+
+
+def _schema_cache_clear() -> None:
+    _schema_cache.clear()
+
+
 def get_table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
-    cur = conn.execute(f"PRAGMA table_info({table})")
-    return [row[1] for row in cur.fetchall()]
+    key = (id(conn), "columns", table)
+    cols = _schema_cache.get(key)
+    if cols is None:
+        cur = conn.execute(f"PRAGMA table_info({table})")
+        cols = [row[1] for row in cur.fetchall()]
+        _schema_cache[key] = cols
+    return cols  # type: ignore[return-value]
 
 
 def table_exists(conn: sqlite3.Connection, table: str) -> bool:
-    r = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)
-    ).fetchone()
-    return r is not None
+    key = (id(conn), "exists", table)
+    if key not in _schema_cache:
+        r = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone()
+        _schema_cache[key] = r is not None
+    return _schema_cache[key]  # type: ignore[return-value]
+
+
+def _merge_watch_history_sql(
+    new_conn: sqlite3.Connection,
+    out_conn: sqlite3.Connection,
+    new_db_path: str,
+) -> tuple[int, int]:
+    """
+    Merge views/settings entirely inside SQLite: attach the new DB to the
+    output connection and run INSERT…SELECT, so no row ever round-trips
+    through Python. Raises sqlite3.Error on failure (caller falls back).
+    """
+    views_added = 0
+    settings_added = 0
+    out_conn.execute("ATTACH DATABASE ? AS newdb", (new_db_path,))
+    try:
+        out_conn.execute("BEGIN IMMEDIATE")
+        guid_filter = (
+            "IN (SELECT guid FROM main.metadata_items "
+            "WHERE guid IS NOT NULL AND guid != '')"
+        )
+
+        if table_exists(new_conn, "metadata_item_views") and table_exists(out_conn, "metadata_item_views"):
+            new_cols = get_table_columns(new_conn, "metadata_item_views")
+            out_cols = get_table_columns(out_conn, "metadata_item_views")
+
+            if "guid" in new_cols:
+                present = [c for c in VIEWS_COLS if c in out_cols and c in new_cols]
+                if present:
+                    before = out_conn.total_changes
+                    out_conn.execute(
+                        "INSERT OR IGNORE INTO metadata_item_views ({cols}) "
+                        "SELECT {sel} FROM newdb.metadata_item_views v "
+                        "WHERE v.guid {filt}".format(
+                            cols=", ".join(_quote(c) for c in present),
+                            sel=", ".join(f"v.{_quote(c)}" for c in present),
+                            filt=guid_filter,
+                        )
+                    )
+                    views_added = out_conn.total_changes - before
+            elif "metadata_item_id" in new_cols and table_exists(new_conn, "metadata_items"):
+                log("metadata_item_views has no guid column; joining via metadata_item_id → metadata_items.guid.")
+                present = [c for c in VIEWS_COLS if c in out_cols and (c == "guid" or c in new_cols)]
+                if present:
+                    before = out_conn.total_changes
+                    out_conn.execute(
+                        "INSERT OR IGNORE INTO metadata_item_views ({cols}) "
+                        "SELECT {sel} FROM newdb.metadata_item_views v "
+                        "JOIN newdb.metadata_items m ON v.metadata_item_id = m.id "
+                        "WHERE m.guid {filt}".format(
+                            cols=", ".join(_quote(c) for c in present),
+                            sel=", ".join("m.guid" if c == "guid" else f"v.{_quote(c)}" for c in present),
+                            filt=guid_filter,
+                        )
+                    )
+                    views_added = out_conn.total_changes - before
+            else:
+                log("metadata_item_views missing guid and metadata_item_id, skipping views merge.")
+
+        if table_exists(new_conn, "metadata_item_settings") and table_exists(out_conn, "metadata_item_settings"):
+            cols = get_table_columns(new_conn, "metadata_item_settings")
+            if "guid" not in cols:
+                log("metadata_item_settings missing guid, skipping.")
+            else:
+                settings_cols = _cols(SETTINGS_COLS)
+                before = out_conn.total_changes
+                out_conn.execute(
+                    f"INSERT OR REPLACE INTO metadata_item_settings ({settings_cols}) "
+                    f"SELECT {settings_cols} FROM newdb.metadata_item_settings "
+                    f"WHERE guid {guid_filter}"
+                )
+                settings_added = out_conn.total_changes - before
+
+        out_conn.commit()
+    finally:
+        # DETACH fails while a transaction is open, so roll back first —
+        # otherwise a failed sub-merge leaves newdb attached and the later
+        # new-items ATTACH degrades to the row-copy path.
+        try:
+            out_conn.rollback()
+        except sqlite3.Error:
+            pass
+        try:
+            out_conn.execute("DETACH DATABASE newdb")
+        except sqlite3.Error:
+            pass
+    return views_added, settings_added
 
 
 def merge_watch_history_and_settings(
     old_conn: sqlite3.Connection,
     new_conn: sqlite3.Connection,
     out_conn: sqlite3.Connection,
+    new_db_path: str | None = None,
 ) -> tuple[int, int]:
     """
     Merge metadata_item_views and metadata_item_settings from new into old.
     Uses guid to resolve metadata_item_id in the old DB. Returns (views_added, settings_added).
+
+    When new_db_path is given the merge runs as ATTACH + INSERT…SELECT
+    inside the SQLite engine; the row-by-row path below is the fallback.
     """
     views_added = 0
     settings_added = 0
@@ -785,8 +1274,35 @@ def merge_watch_history_and_settings(
     # Build guid -> id map from old DB
     if not table_exists(old_conn, "metadata_items"):
         return 0, 0
-    cur = old_conn.execute("SELECT id, guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''")
-    guid_to_id_old = {row[1]: row[0] for row in cur.fetchall()}
+
+    # The guid probes below (the IN subquery on the SQL path) want an index
+    # on metadata_items.guid. Plex ships one, but a backup rebuilt via
+    # .recover may have lost it — without it every probe is a table scan.
+    # Dropped again before the output is finalized.
+    try:
+        out_conn.execute("CREATE INDEX IF NOT EXISTS tmp_plexdb_mi_guid ON metadata_items(guid)")
+    except sqlite3.Error as e:
+        log(f"Warning: could not create temporary guid index: {e}")
+
+    if new_db_path:
+        try:
+            return _merge_watch_history_sql(new_conn, out_conn, new_db_path)
+        except sqlite3.Error as e:
+            log(f"SQL-side watch merge failed ({e}); falling back to row copy.")
+            out_conn.rollback()
+    # Only guid membership matters below (the inserts carry the guid itself,
+    # never the old id), so a set is enough — half the footprint of the old
+    # guid -> id dict.
+    old_guid_set = {
+        guid
+        for (guid,) in old_conn.execute(
+            "SELECT guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
+        )
+    }
+
+    # One transaction for the whole merge: grab the write lock up front and
+    # pay for a single commit at the end instead of one per section.
+    out_conn.execute("BEGIN IMMEDIATE")
 
     # --- metadata_item_views ---
     if table_exists(new_conn, "metadata_item_views") and table_exists(out_conn, "metadata_item_views"):
@@ -796,22 +1312,11 @@ def merge_watch_history_and_settings(
 
         # Newer schema: metadata_item_views already has guid column we can match on directly.
         if "guid" in new_cols:
-            cur = new_conn.execute(
-                "SELECT account_id, guid, metadata_type, library_section_id, grandparent_title, "
-                "parent_index, parent_title, [index], title, thumb_url, viewed_at, grandparent_guid, "
-                "originally_available_at, device_id FROM metadata_item_views"
-            )
+            cur = new_conn.execute(VIEWS_SELECT_SQL)
         # Older schema: no guid column; join via metadata_item_id -> metadata_items.guid.
         elif "metadata_item_id" in new_cols and table_exists(new_conn, "metadata_items"):
             log("metadata_item_views has no guid column; joining via metadata_item_id → metadata_items.guid.")
-            cur = new_conn.execute(
-                "SELECT v.account_id, m.guid, v.metadata_type, v.library_section_id, v.grandparent_title, "
-                "v.parent_index, v.parent_title, v.[index], v.title, v.thumb_url, v.viewed_at, v.grandparent_guid, "
-                "v.originally_available_at, v.device_id "
-                "FROM metadata_item_views v "
-                "JOIN metadata_items m ON v.metadata_item_id = m.id "
-                "WHERE m.guid IS NOT NULL AND m.guid != ''"
-            )
+            cur = new_conn.execute(VIEWS_SELECT_JOIN_SQL)
         else:
             log("metadata_item_views missing guid and metadata_item_id, skipping views merge.")
             cur = None
@@ -819,49 +1324,39 @@ def merge_watch_history_and_settings(
         if cur is not None:
             # Map desired columns to indices in the SELECT row; then only insert those
             # that actually exist in the destination table to avoid "N values for M columns".
-            desired = [
-                ("account_id", 0),
-                ("guid", 1),
-                ("metadata_type", 2),
-                ("library_section_id", 3),
-                ("grandparent_title", 4),
-                ("parent_index", 5),
-                ("parent_title", 6),
-                ("[index]", 7),
-                ("title", 8),
-                ("thumb_url", 9),
-                ("viewed_at", 10),
-                ("grandparent_guid", 11),
-                ("originally_available_at", 12),
-                ("device_id", 13),
-            ]
-            # Normalise column names for comparison (strip [] for index)
-            def _norm(name: str) -> str:
-                return "index" if name == "[index]" else name
-
-            present = [(col, idx) for (col, idx) in desired if _norm(col) in out_cols]
+            present = [(col, idx) for idx, col in enumerate(VIEWS_COLS) if col in out_cols]
             if not present:
                 log("metadata_item_views merge: no overlapping columns between source and destination, skipping.")
             else:
-                col_list = ", ".join(col for (col, _) in present)
+                col_list = ", ".join(_quote(col) for (col, _) in present)
                 placeholders = ", ".join("?" for _ in present)
                 sql = (
                     "INSERT OR IGNORE INTO metadata_item_views "
                     f"({col_list}) VALUES ({placeholders})"
                 )
-                for row in cur.fetchall():
-                    guid = row[1]
-                    old_id = guid_to_id_old.get(guid)
-                    if old_id is None:
-                        continue
+                rows_to_insert = [
+                    tuple(row[idx] for (_, idx) in present)
+                    for row in cur
+                    if row[1] in old_guid_set
+                ]
+                if rows_to_insert:
+                    # One executemany instead of a Python->SQLite round-trip
+                    # per row; rowcount sums the rows actually inserted
+                    # (OR IGNORE skips count as zero).
                     try:
-                        values = tuple(row[idx] for (_, idx) in present)
-                        out_cur.execute(sql, values)
-                        if out_cur.rowcount:
-                            views_added += 1
+                        out_cur.executemany(sql, rows_to_insert)
+                        views_added = max(out_cur.rowcount, 0)
                     except sqlite3.IntegrityError:
-                        pass
-                out_conn.commit()
+                        # Rare non-ignorable constraint; fall back to row-by-row
+                        # (OR IGNORE makes re-running the batch idempotent).
+                        views_added = 0
+                        for values in rows_to_insert:
+                            try:
+                                out_cur.execute(sql, values)
+                                if out_cur.rowcount:
+                                    views_added += 1
+                            except sqlite3.IntegrityError:
+                                pass
 
     # --- metadata_item_settings ---
     if table_exists(new_conn, "metadata_item_settings") and table_exists(out_conn, "metadata_item_settings"):
@@ -869,77 +1364,137 @@ def merge_watch_history_and_settings(
         if "guid" not in cols:
             log("metadata_item_settings missing guid, skipping.")
         else:
-            cur = new_conn.execute(
-                "SELECT account_id, guid, rating, view_offset, view_count, last_viewed_at, "
-                "created_at, updated_at, skip_count, last_skipped_at, changed_at, extra_data "
-                "FROM metadata_item_settings"
-            )
+            cur = new_conn.execute(SETTINGS_SELECT_SQL)
             out_cur = out_conn.cursor()
-            for row in cur.fetchall():
-                guid = row[1]
-                old_id = guid_to_id_old.get(guid)
-                if old_id is None:
-                    continue
+            settings_sql = SETTINGS_INSERT_SQL
+            settings_rows = [row for row in cur if row[1] in old_guid_set]
+            if settings_rows:
                 try:
-                    out_cur.execute(
-                        "INSERT OR REPLACE INTO metadata_item_settings "
-                        "(account_id, guid, rating, view_offset, view_count, last_viewed_at, "
-                        "created_at, updated_at, skip_count, last_skipped_at, changed_at, extra_data) "
-                        "VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
-                        (row[0], guid, row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11]),
-                    )
-                    if out_cur.rowcount:
-                        settings_added += 1
+                    out_cur.executemany(settings_sql, settings_rows)
+                    settings_added = max(out_cur.rowcount, 0)
                 except sqlite3.IntegrityError:
-                    pass
-            out_conn.commit()
+                    settings_added = 0
+                    for row in settings_rows:
+                        try:
+                            out_cur.execute(settings_sql, row)
+                            if out_cur.rowcount:
+                                settings_added += 1
+                        except sqlite3.IntegrityError:
+                            pass
 
+    out_conn.commit()
     return views_added, settings_added
 
 
 def get_old_max_ids(conn: sqlite3.Connection) -> dict[str, int]:
     """Return max id for metadata_items, media_items, media_parts, etc."""
     tables = ("metadata_items", "media_items", "media_parts", "media_streams", "directories", "taggings", "tags")
-    out = {}
-    for t in tables:
-        if not table_exists(conn, t):
-            out[t] = 0
-            continue
-        r = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()
-        out[t] = r[0] if r else 0
+    out = {t: 0 for t in tables}
+    remaining = {t for t in tables if table_exists(conn, t)}
+    # AUTOINCREMENT tables record their high-water mark in sqlite_sequence:
+    # one tiny table scan instead of a MAX(id) per table. seq never shrinks
+    # on delete, so it is >= MAX(id) — exactly what ID allocation wants.
+    if table_exists(conn, "sqlite_sequence"):
+        marks = ",".join("?" * len(tables))
+        for name, seq in conn.execute(
+            f"SELECT name, seq FROM sqlite_sequence WHERE name IN ({marks})", tables
+        ):
+            if seq is not None:
+                out[name] = seq
+                remaining.discard(name)
+    # Anything not covered (no AUTOINCREMENT) still needs MAX(id), but as a
+    # single UNION ALL statement rather than one round-trip per table.
+    if remaining:
+        union = " UNION ALL ".join(
+            f"SELECT '{t}', COALESCE(MAX(id), 0) FROM {t}" for t in sorted(remaining)
+        )
+        for name, mx in conn.execute(union):
+            out[name] = mx
     return out
 
 
+def _copy_new_items_sql(
+    new_conn: sqlite3.Connection,
+    out_conn: sqlite3.Connection,
+    meta_map_rows: list[tuple[int, int, int]],
+    max_ids: dict,
+) -> None:
+    """
+    Copy the new metadata_items and their media_items/media_parts/
+    media_streams entirely inside SQLite: the id maps live in temp tables
+    and each table copies with one INSERT…SELECT against the attached new
+    DB, so no row ever round-trips through Python. meta_map_rows is
+    (new_id, out_id, keep) — keep=0 rows (cycles, invalid sections) remap
+    child references without being inserted themselves. Assumes the new DB
+    is attached as newdb and a transaction is open. Raises sqlite3.Error on
+    failure (the caller rolls back to its savepoint and falls back to the
+    row copy).
+    """
+    out_conn.execute("CREATE TEMP TABLE tmp_plexdb_meta_map (new_id INTEGER PRIMARY KEY, out_id INTEGER, keep INTEGER)")
+    out_conn.execute("CREATE TEMP TABLE tmp_plexdb_media_map (new_id INTEGER PRIMARY KEY, out_id INTEGER)")
+    out_conn.execute("CREATE TEMP TABLE tmp_plexdb_part_map (new_id INTEGER PRIMARY KEY, out_id INTEGER)")
+    try:
+        out_conn.executemany(
+            "INSERT INTO tmp_plexdb_meta_map VALUES (?, ?, ?)", meta_map_rows
+        )
+        out_conn.execute(META_COPY_SQL)
+        if not (table_exists(new_conn, "media_items") and table_exists(out_conn, "media_items")):
+            return
+        # Assign new ids in SQL with the same scheme as the row-copy path:
+        # consecutive from the output's high-water mark, in source-id order.
+        out_conn.execute(
+            "INSERT INTO tmp_plexdb_media_map "
+            "SELECT mi.id, ? + ROW_NUMBER() OVER (ORDER BY mi.id) "
+            "FROM newdb.media_items mi "
+            "JOIN tmp_plexdb_meta_map mm ON mm.new_id = mi.metadata_item_id",
+            (max_ids["media_items"],),
+        )
+        out_conn.execute(MEDIA_ITEMS_COPY_SQL)
+        if table_exists(new_conn, "media_parts") and table_exists(out_conn, "media_parts"):
+            out_conn.execute(
+                "INSERT INTO tmp_plexdb_part_map "
+                "SELECT p.id, ? + ROW_NUMBER() OVER (ORDER BY p.id) "
+                "FROM newdb.media_parts p "
+                "JOIN tmp_plexdb_media_map m ON m.new_id = p.media_item_id",
+                (max_ids["media_parts"],),
+            )
+            out_conn.execute(MEDIA_PARTS_COPY_SQL)
+        if table_exists(new_conn, "media_streams") and table_exists(out_conn, "media_streams"):
+            out_conn.execute(MEDIA_STREAMS_COPY_SQL, (max_ids["media_streams"],))
+    finally:
+        for t in ("tmp_plexdb_meta_map", "tmp_plexdb_media_map", "tmp_plexdb_part_map"):
+            out_conn.execute(f"DROP TABLE IF EXISTS temp.{t}")
+
+
 def merge_new_library_items(
     old_conn: sqlite3.Connection,
     new_conn: sqlite3.Connection,
     out_conn: sqlite3.Connection,
+    new_db_path: str | None = None,
 ) -> int:
     """
     Copy metadata_items from new that don't exist in old (by guid), and their
     media_items, media_parts, media_streams. Remap IDs to avoid collisions.
     Returns count of new metadata_items added.
+
+    When new_db_path is given the new rows copy as ATTACH + INSERT…SELECT
+    via _copy_new_items_sql; the row-by-row path is the fallback.
     """
     if not table_exists(new_conn, "metadata_items") or not table_exists(old_conn, "metadata_items"):
         return 0
 
-    cur = old_conn.execute("SELECT id, guid FROM metadata_items")
-    old_guids = {row[1] for row in cur.fetchall() if row[1]}
-
-    cur = new_conn.execute(
-        "SELECT id, library_section_id, parent_id, metadata_type, guid, media_item_count, title, title_sort, "
-        "original_title, studio, rating, rating_count, tagline, summary, trivia, quotes, content_rating, "
-        "content_rating_age, [index], absolute_index, duration, user_thumb_url, user_art_url, user_banner_url, "
-        "user_music_url, user_fields, tags_genre, tags_collection, tags_director, tags_writer, tags_star, "
-        "originally_available_at, available_at, expires_at, refreshed_at, year, added_at, created_at, updated_at, "
-        "deleted_at, tags_country, extra_data, hash, audience_rating, changed_at, resources_changed_at, remote "
-        "FROM metadata_items"
+    # frozenset: built once, probed once per new row in the filter below.
+    old_guids = frozenset(
+        g
+        for (g,) in old_conn.execute(
+            "SELECT guid FROM metadata_items WHERE guid IS NOT NULL AND guid != ''"
+        )
     )
-    new_rows = cur.fetchall()
-    new_cols = get_table_columns(new_conn, "metadata_items")
 
-    # Only rows whose guid is not in old
-    to_add = [r for r in new_rows if r[4] and r[4] not in old_guids]
+    cur = new_conn.execute(META_SELECT_SQL)
+    # Filter while streaming the cursor: only rows whose guid is not in old
+    # are kept, so the full new metadata table is never held in memory.
+    to_add = [r for r in cur if r[4] and r[4] not in old_guids]
     if not to_add:
         return 0
 
@@ -951,128 +1506,163 @@ def merge_new_library_items(
         next_meta_id += 1
 
     new_meta_ids = {r[0] for r in to_add}
-    # Insert in dependency order: parent before child (parent_id in to_add must be inserted first)
-    added = set()
+    # Attach before the transaction opens (SQLite forbids ATTACH inside one)
+    # so the new rows can copy SQL-side below.
+    attached = False
+    if new_db_path:
+        try:
+            out_conn.execute("ATTACH DATABASE ? AS newdb", (new_db_path,))
+            attached = True
+        except sqlite3.Error as e:
+            log(f"Could not attach new DB for SQL-side copy ({e}); using row copy.")
+    # Single transaction for metadata_items and all child tables below; one
+    # commit once everything is in.
+    out_conn.execute("BEGIN IMMEDIATE")
+
+    # Bulk-load trick: every insert below would otherwise update each of
+    # Plex's many secondary indexes in place. Drop them first and rebuild
+    # once after the data is in — same idea as indexing after COPY. Only
+    # worth the rebuild cost for big batches; unique constraints live in
+    # autoindexes, which SQLite won't let us (or need us to) drop. Running
+    # inside the transaction means a failed merge rolls the drops back too.
+    idx_defs: list[tuple[str, str]] = []
+    if len(to_add) > 500:
+        idx_defs = out_conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='index' "
+            "AND tbl_name IN ('metadata_items','media_items','media_parts','media_streams') "
+            "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_autoindex%' "
+            "AND name != 'tmp_plexdb_mi_guid'"
+        ).fetchall()
+        for name, _ in idx_defs:
+            out_conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+    # Walk parents before children: Kahn's algorithm emits the rows to keep
+    # in one linear pass; every parent has at most one edge to each child, so
+    # a row becomes ready the moment its parent is popped. Rows in a parent
+    # cycle (corrupt data) are never emitted, matching the old no-progress
+    # bail-out.
     out_cur = out_conn.cursor()
-    while len(added) < len(to_add):
-        progress = 0
-        for r in to_add:
-            if r[0] in added:
-                continue
-            parent_id = r[2]
-            if parent_id is None or parent_id not in new_meta_ids or parent_id in added:
-                new_id, library_section_id, parent_id, *rest = r
-                if library_section_id:
-                    check = old_conn.execute("SELECT 1 FROM library_sections WHERE id=?", (library_section_id,)).fetchone()
-                    if not check:
-                        added.add(r[0])  # skip but don't retry
-                        continue
-                progress += 1
-                added.add(r[0])
-                out_id = new_meta_id_to_old[new_id]
-                parent_out = new_meta_id_to_old.get(parent_id) if parent_id else None
-                if parent_id and parent_id in new_meta_id_to_old:
-                    parent_out = new_meta_id_to_old[parent_id]
-                out_cur.execute(
-                    "INSERT INTO metadata_items (id, library_section_id, parent_id, metadata_type, guid, media_item_count, "
-                    "title, title_sort, original_title, studio, rating, rating_count, tagline, summary, trivia, quotes, "
-                    "content_rating, content_rating_age, [index], absolute_index, duration, user_thumb_url, user_art_url, "
-                    "user_banner_url, user_music_url, user_fields, tags_genre, tags_collection, tags_director, tags_writer, "
-                    "tags_star, originally_available_at, available_at, expires_at, refreshed_at, year, added_at, created_at, "
-                    "updated_at, deleted_at, tags_country, extra_data, hash, audience_rating, changed_at, resources_changed_at, remote) "
-                    "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                    (out_id, library_section_id, parent_out if parent_out else parent_id, *rest),
-                )
-        if progress == 0:
-            break
-    out_conn.commit()
-
-    # media_items for these metadata_item_ids
-    new_meta_ids_in_new = {r[0] for r in to_add}
-    if table_exists(new_conn, "media_items") and table_exists(out_conn, "media_items"):
-        cur = new_conn.execute(
-            "SELECT id, library_section_id, section_location_id, metadata_item_id, type_id, width, height, size, "
-            "duration, bitrate, container, video_codec, audio_codec, display_aspect_ratio, frames_per_second, "
-            "audio_channels, interlaced, source, hints, display_offset, settings, created_at, updated_at, "
-            "optimized_for_streaming, deleted_at, media_analysis_version, sample_aspect_ratio, extra_data, "
-            "proxy_type, channel_id, begins_at, ends_at FROM media_items WHERE metadata_item_id IN ({})".format(
-                ",".join(map(str, new_meta_ids_in_new))
-            )
-        )
-        media_rows = cur.fetchall()
-        next_media_id = max_ids["media_items"] + 1
-        new_media_id_to_old = {}
-        for row in media_rows:
-            new_media_id_to_old[row[0]] = next_media_id
-            next_media_id += 1
-        for row in media_rows:
-            new_meta_id = row[3]
-            out_meta_id = new_meta_id_to_old.get(new_meta_id)
-            if not out_meta_id:
-                continue
-            out_media_id = new_media_id_to_old[row[0]]
-            out_cur.execute(
-                "INSERT INTO media_items (id, library_section_id, section_location_id, metadata_item_id, type_id, "
-                "width, height, size, duration, bitrate, container, video_codec, audio_codec, display_aspect_ratio, "
-                "frames_per_second, audio_channels, interlaced, source, hints, display_offset, settings, created_at, "
-                "updated_at, optimized_for_streaming, deleted_at, media_analysis_version, sample_aspect_ratio, "
-                "extra_data, proxy_type, channel_id, begins_at, ends_at) "
-                "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                (out_media_id, row[1], row[2], out_meta_id, row[4], row[5], row[6], row[7], row[8], row[9], row[10],
-                 row[11], row[12], row[13], row[14], row[15], row[16], row[17], row[18], row[19], row[20], row[21],
-                 row[22], row[23], row[24], row[25], row[26], row[27], row[28], row[29], row[30], row[31]),
+    # library_sections is tiny (one row per library); load the valid ids once
+    # instead of a SELECT per metadata row.
+    if table_exists(old_conn, "library_sections"):
+        valid_sections = frozenset(i for (i,) in old_conn.execute("SELECT id FROM library_sections"))
+    else:
+        valid_sections = frozenset()
+    children: dict[int, list[tuple]] = {}
+    ready: collections.deque = collections.deque()
+    for r in to_add:
+        parent_id = r[2]
+        if parent_id is not None and parent_id != r[0] and parent_id in new_meta_ids:
+            children.setdefault(parent_id, []).append(r)
+        else:
+            ready.append(r)
+    kept_rows = []
+    while ready:
+        r = ready.popleft()
+        # Release children first: a row skipped for a missing section still
+        # unblocks its descendants, as before.
+        ready.extend(children.pop(r[0], ()))
+        if r[1] and r[1] not in valid_sections:
+            continue
+        kept_rows.append(r)
+
+    # metadata_items and the media child tables copy SQL-side in one go; a
+    # savepoint scopes the attempt so a failure rolls back cleanly to the
+    # row-copy path below.
+    sql_copied = False
+    if attached:
+        kept_ids = {r[0] for r in kept_rows}
+        meta_map_rows = [
+            (new_id, out_id, 1 if new_id in kept_ids else 0)
+            for new_id, out_id in new_meta_id_to_old.items()
+        ]
+        out_conn.execute("SAVEPOINT items_sql")
+        try:
+            _copy_new_items_sql(new_conn, out_conn, meta_map_rows, max_ids)
+            out_conn.execute("RELEASE items_sql")
+            sql_copied = True
+        except sqlite3.Error as e:
+            log(f"SQL-side item copy failed ({e}); falling back to row copy.")
+            out_conn.execute("ROLLBACK TO items_sql")
+            out_conn.execute("RELEASE items_sql")
+
+    if not sql_copied:
+        # Row-copy fallback for metadata: shape the remapped tuples in Python
+        # and insert with one executemany (prepared once, bound per row). All
+        # ids were assigned up front, so parent references don't depend on
+        # insert order.
+        meta_insert_rows = []
+        for r in kept_rows:
+            new_id, library_section_id, parent_id, *rest = r
+            out_id = new_meta_id_to_old[new_id]
+            parent_out = new_meta_id_to_old.get(parent_id) if parent_id else None
+            meta_insert_rows.append(
+                (out_id, library_section_id, parent_out if parent_out else parent_id, *rest)
             )
-        out_conn.commit()
+        if meta_insert_rows:
+            out_cur.executemany(META_INSERT_SQL, meta_insert_rows)
+
+    if not sql_copied and table_exists(new_conn, "media_items") and table_exists(out_conn, "media_items"):
+        media_rows = list(_select_in_chunks(new_conn, MEDIA_ITEMS_SELECT_SQL, new_meta_ids))
+        # One comprehension instead of a counter loop: enumerate hands out the
+        # consecutive ids from the high-water mark.
+        new_media_id_to_old = {
+            row[0]: out_id
+            for out_id, row in enumerate(media_rows, start=max_ids["media_items"] + 1)
+        }
+        # No membership guard: the WHERE-IN above selected on exactly the ids
+        # in new_meta_id_to_old, so every lookup hits.
+        # Slice-and-concat builds the insert tuples in C instead of unpacking
+        # every column through bytecode.
+        media_insert_rows = [
+            (new_media_id_to_old[row[0]],) + row[1:3] + (new_meta_id_to_old[row[3]],) + row[4:]
+            for row in media_rows
+        ]
+        if media_insert_rows:
+            out_cur.executemany(MEDIA_ITEMS_INSERT_SQL, media_insert_rows)
 
         # media_parts for these media_items
         new_media_ids = set(new_media_id_to_old.keys())
+        part_id_map = {}  # new media_parts.id -> assigned id in out
         if new_media_ids and table_exists(new_conn, "media_parts") and table_exists(out_conn, "media_parts"):
-            cur = new_conn.execute(
-                "SELECT id, media_item_id, directory_id, hash, open_subtitle_hash, file, [index], size, duration, "
-                "created_at, updated_at, deleted_at, extra_data FROM media_parts WHERE media_item_id IN ({})".format(
-                    ",".join(map(str, new_media_ids))
-                )
-            )
-            part_rows = cur.fetchall()
-            next_part_id = max_ids["media_parts"] + 1
-            for row in part_rows:
-                out_media_id = new_media_id_to_old.get(row[1])
-                if not out_media_id:
-                    continue
-                out_cur.execute(
-                    "INSERT INTO media_parts (id, media_item_id, directory_id, hash, open_subtitle_hash, file, "
-                    "[index], size, duration, created_at, updated_at, deleted_at, extra_data) "
-                    "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                    (next_part_id, out_media_id, row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11], row[12]),
-                )
-                next_part_id += 1
-            out_conn.commit()
+            # Same guarantee as above: the SELECT is keyed on new_media_ids,
+            # so the media-id lookup always hits and no guard is needed.
+            part_insert_rows = []
+            for next_part_id, row in enumerate(
+                _select_in_chunks(new_conn, MEDIA_PARTS_SELECT_SQL, new_media_ids),
+                start=max_ids["media_parts"] + 1,
+            ):
+                part_id_map[row[0]] = next_part_id
+                part_insert_rows.append((next_part_id, new_media_id_to_old[row[1]]) + row[2:])
+            if part_insert_rows:
+                out_cur.executemany(MEDIA_PARTS_INSERT_SQL, part_insert_rows)
 
         # media_streams for these media_items
         if new_media_ids and table_exists(new_conn, "media_streams") and table_exists(out_conn, "media_streams"):
-            cur = new_conn.execute(
-                "SELECT id, stream_type_id, media_item_id, url, codec, language, created_at, updated_at, "
-                "[index], media_part_id, channels, bitrate, url_index, [default], forced, extra_data "
-                "FROM media_streams WHERE media_item_id IN ({})".format(",".join(map(str, new_media_ids)))
-            )
-            stream_rows = cur.fetchall()
-            next_stream_id = max_ids["media_streams"] + 1
-            # media_part_id remap: we don't have a simple part id map (we assigned new ids). Skip remap for now;
-            # media_part_id can stay 0 or original if it referred to a part in same set we'd need part id map
-            for row in stream_rows:
-                out_media_id = new_media_id_to_old.get(row[2])
-                if not out_media_id:
-                    continue
-                out_cur.execute(
-                    "INSERT INTO media_streams (id, stream_type_id, media_item_id, url, codec, language, created_at, "
-                    "updated_at, [index], media_part_id, channels, bitrate, url_index, [default], forced, extra_data) "
-                    "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                    (next_stream_id, row[1], out_media_id, row[3], row[4], row[5], row[6], row[7], row[8], row[9],
-                     row[10], row[11], row[12], row[13], row[14], row[15]),
+            stream_insert_rows = []
+            for next_stream_id, row in enumerate(
+                _select_in_chunks(new_conn, MEDIA_STREAMS_SELECT_SQL, new_media_ids),
+                start=max_ids["media_streams"] + 1,
+            ):
+                # Remap media_part_id through the parts copied above so the
+                # stream points at its part's new id, not the stale one from
+                # the source DB (unmapped values pass through unchanged).
+                stream_insert_rows.append(
+                    (next_stream_id, row[1], new_media_id_to_old[row[2]])
+                    + row[3:9] + (part_id_map.get(row[9], row[9]),) + row[10:]
                 )
-                next_stream_id += 1
-            out_conn.commit()
+            if stream_insert_rows:
+                out_cur.executemany(MEDIA_STREAMS_INSERT_SQL, stream_insert_rows)
 
+    if idx_defs:
+        log(f"Rebuilding {len(idx_defs)} indexes after bulk insert…")
+        for _, sql in idx_defs:
+            out_conn.execute(sql)
+    out_conn.commit()
+    if attached:
+        try:
+            out_conn.execute("DETACH DATABASE newdb")
+        except sqlite3.Error:
+            pass
     return len(to_add)
 
 
@@ -1085,11 +1675,17 @@ def main() -> int:
     parser.add_argument("--output", required=True, help="Path for merged output DB (will overwrite)")
     parser.add_argument("--recover", action="store_true", help="If --new won't open, try sqlite3 .recover first")
     parser.add_argument("--merge-new-items", action="store_true", help="Also copy new library items (metadata_items + media) with ID remap")
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="Run PRAGMA integrity_check on the output (full-DB scan; the base copy "
+             "is an intact backup, so this mainly matters with --recover or --merge-new-items)",
+    )
     args = parser.parse_args()
 
     success, err = run_merge(
         args.old, args.new, args.output,
         recover=args.recover, merge_new_items=args.merge_new_items,
+        verify=args.verify,
     )
     return 0 if success else 1
 